@@ -0,0 +1,289 @@
+"""Локальные заглушки fmza.ru, selftest-mpe и tests-exam.ru для бенчмарка.
+
+Страницы повторяют только то, на что опирается WebHandler: ссылки
+портала, форму j_username/j_password, страницу теста xsltforms с
+table.question_options, списком вопросов и кнопкой "Далее", а также
+поиск и страницу ответа с #prav_id в cp1251. Каждый запрос задерживается
+на latency_ms, запросы к сайту ответов - на answer_latency_ms.
+"""
+import asyncio
+import json
+import random
+import re
+
+from collections import Counter
+from dataclasses import dataclass, field
+from html import escape
+from urllib import parse
+
+from aiohttp import web
+
+
+WORDS = (
+    "препарат лекарственный форма хранение температура аптека рецепт отпуск "
+    "дозировка таблетка раствор инъекция мазь суспензия упаковка маркировка "
+    "срок годности условие контроль качество фармацевтический провизор склад "
+    "поставщик документ учет реализация витамин антибиотик анальгетик сироп"
+).split()
+
+SESSION_COOKIE = "JSESSIONID"
+QUESTION_ID = "xsltforms-subform-0-output-14_4_2_"
+LIST_BUTTON_ID = "xsltforms-subform-0-label-2_2_2_6_2_10_4_2_"
+STATIC_ASSET_SIZE = 50_000
+# Кэшируемый скрипт, как бандлы xsltforms/dijit: повторно скачивается,
+# только если у контекста выключен HTTP-кэш
+SCRIPT_CACHE_CONTROL = "public, max-age=3600"
+
+
+@dataclass
+class Question:
+    text: str
+    options: list[str]
+    correct: int
+
+
+@dataclass
+class FixtureState:
+    questions: list[Question]
+    latency_ms: float = 0
+    answer_latency_ms: float = 0
+    sessions: set[str] = field(default_factory=set)
+    answers: dict[str, dict[int, int]] = field(default_factory=dict)
+    asset_requests: Counter = field(default_factory=Counter)
+
+    def score(self, session: str) -> int:
+        chosen = self.answers.get(session, {})
+        return sum(1 for index, option in chosen.items() if self.questions[index].correct == option)
+
+
+def generate_questions(count: int, seed: int = 42) -> list[Question]:
+    rng = random.Random(seed)
+    questions = []
+    for number in range(count):
+        text = f"Вопрос {number + 1} " + " ".join(rng.choice(WORDS) for _ in range(12)) + "?"
+        options = [" ".join(rng.choice(WORDS) for _ in range(5)) for _ in range(4)]
+        questions.append(Question(text=text, options=options, correct=rng.randrange(4)))
+    return questions
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", "", text, flags=re.UNICODE).split())
+
+
+def _page(body: str, title: str = "") -> web.Response:
+    # Картинка, шрифт и общий скрипт на каждой странице, как на настоящих сайтах
+    return web.Response(
+        text=f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>"
+             "<style>@font-face{font-family:f;src:url(/static/font.woff2)} body{font-family:f}</style>"
+             "<script src='/static/app.js'></script>"
+             f"</head><body><img src='/static/logo.png'>{body}</body></html>",
+        content_type="text/html"
+    )
+
+
+async def static_asset(request: web.Request) -> web.Response:
+    name = request.match_info["name"]
+    request.app["state"].asset_requests[name] += 1
+    if name.endswith(".js"):
+        return web.Response(
+            text="/*" + "x" * STATIC_ASSET_SIZE + "*/",
+            content_type="application/javascript",
+            headers={"Cache-Control": SCRIPT_CACHE_CONTROL}
+        )
+    return web.Response(body=bytes(STATIC_ASSET_SIZE), content_type="application/octet-stream")
+
+
+@web.middleware
+async def latency_middleware(request: web.Request, handler):
+    state: FixtureState = request.app["state"]
+    delay = state.answer_latency_ms if request.path.startswith("/answers/") else state.latency_ms
+    if delay:
+        await asyncio.sleep(delay / 1000)
+    return await handler(request)
+
+
+# --- fmza.ru ---
+
+async def portal_index(request: web.Request) -> web.Response:
+    return _page('<a href="/portal/spo">Первичная аккредитация (СПО)</a>', "fmza")
+
+
+async def portal_spo(request: web.Request) -> web.Response:
+    return _page('<a href="/portal/spo/specialties">Специальности СПО</a>', "СПО")
+
+
+async def portal_specialties(request: web.Request) -> web.Response:
+    return _page("<p>Специальности</p>", "Специальности")
+
+
+# --- selftest-mpe ---
+
+def _session(request: web.Request) -> str | None:
+    session = request.cookies.get(SESSION_COOKIE)
+    return session if session in request.app["state"].sessions else None
+
+
+async def selftest_index(request: web.Request) -> web.Response:
+    if _session(request):
+        raise web.HTTPFound("/selftest/home")
+    return _page(
+        '<form method="post" action="/selftest/login">'
+        '<input name="j_username"><input name="j_password" type="password">'
+        '<input class="login-button" type="submit" value="Войти">'
+        '</form>',
+        "Вход"
+    )
+
+
+async def selftest_login(request: web.Request) -> web.Response:
+    form = await request.post()
+    if not form.get("j_username") or not form.get("j_password"):
+        raise web.HTTPFound("/selftest/")
+    state: FixtureState = request.app["state"]
+    session = f"{form['j_username']}-{len(state.sessions)}"
+    state.sessions.add(session)
+    response = web.HTTPFound("/selftest/home")
+    response.set_cookie(SESSION_COOKIE, session)
+    raise response
+
+
+async def selftest_home(request: web.Request) -> web.Response:
+    if not _session(request):
+        raise web.HTTPFound("/selftest/")
+    return _page('<span id="dijit_form_Button_0_label">Пройти тестирование</span>', "Кабинет")
+
+
+async def selftest_test(request: web.Request) -> web.Response:
+    if not _session(request):
+        raise web.HTTPFound("/selftest/")
+    state: FixtureState = request.app["state"]
+    answered = state.answers.get(_session(request), {})
+    items = "".join(
+        f'<div class="xforms-repeat-item{" answered" if number in answered else ""}">'
+        f'{number + 1}. {escape(question.text)}</div>'
+        for number, question in enumerate(state.questions)
+    )
+    first = state.questions[0]
+    # Первый вопрос встраивается в страницу, чтобы он был на месте уже к
+    # domcontentloaded, следующие подгружаются по кнопке "Далее"
+    script = """
+    let current = 0;
+    function render(data) {
+        document.querySelector('#%(qid)s span span p').innerText = data.text;
+        const body = document.querySelector('table.question_options tbody');
+        body.innerHTML = '';
+        data.options.forEach((text, option) => {
+            const row = document.createElement('tr');
+            row.innerHTML = '<td class="dijitReset"></td><td></td><td></td>';
+            row.cells[0].innerText = 'АБВГ'[option];
+            row.cells[1].innerText = 'АБВГ'[option];
+            row.cells[2].innerText = text;
+            row.cells[0].onclick = () => {
+                document.querySelectorAll('.xforms-repeat-item')[current].classList.add('answered');
+                fetch('/selftest/api/answer?i=' + current + '&o=' + option, {method: 'POST'});
+            };
+            body.appendChild(row);
+        });
+    }
+    async function load(index) {
+        const response = await fetch('/selftest/api/question?i=' + index);
+        current = index;
+        render(await response.json());
+    }
+    document.getElementById('next').onclick = () => load((current + 1) %% %(count)d);
+    document.querySelectorAll('.xforms-repeat-item').forEach((item, index) => {
+        item.onclick = () => load(index);
+    });
+    document.getElementById('%(list)s').onclick = () => {
+        document.getElementById('list').style.display = 'block';
+    };
+    render(%(first)s);
+    """ % {
+        "qid": QUESTION_ID,
+        "count": len(state.questions),
+        "list": LIST_BUTTON_ID,
+        "first": json.dumps({"text": first.text, "options": first.options}, ensure_ascii=False)
+    }
+    return _page(
+        f'<button><span id="{LIST_BUTTON_ID}">К списку вопросов</span></button>'
+        f'<div id="list" style="display:none">{items}</div>'
+        f'<div id="{QUESTION_ID}"><span><span><p></p></span></span></div>'
+        '<table class="question_options"><tbody></tbody></table>'
+        '<button id="next">Далее</button>'
+        f'<script>{script}</script>',
+        "Тест"
+    )
+
+
+async def selftest_question(request: web.Request) -> web.Response:
+    state: FixtureState = request.app["state"]
+    question = state.questions[int(request.query["i"])]
+    return web.json_response({"text": question.text, "options": question.options})
+
+
+async def selftest_answer(request: web.Request) -> web.Response:
+    session = _session(request)
+    if session:
+        state: FixtureState = request.app["state"]
+        state.answers.setdefault(session, {})[int(request.query["i"])] = int(request.query["o"])
+    return web.Response(text="ok")
+
+
+# --- tests-exam.ru (cp1251) ---
+
+def _cp1251_page(body: str) -> web.Response:
+    text = f"<html><head><meta charset='windows-1251'></head><body>{body}</body></html>"
+    return web.Response(body=text.encode("cp1251"), content_type="text/html", charset="windows-1251")
+
+
+async def answers_search(request: web.Request) -> web.Response:
+    # Запрос закодирован в cp1251, поэтому разбираем сырую строку запроса
+    raw = dict(part.split("=", 1) for part in request.query_string.split("&") if "=" in part)
+    query = parse.unquote_to_bytes(raw.get("sea", "")).decode("cp1251", errors="replace")
+    state: FixtureState = request.app["state"]
+    for number, question in enumerate(state.questions):
+        if _normalize(question.text).startswith(_normalize(query)):
+            return _cp1251_page(f'<div class="b"><a href="/answers/vopros.html?id={number}">{escape(query)}</a></div>')
+    return _cp1251_page("<p>Ничего не найдено</p>")
+
+
+async def answers_question(request: web.Request) -> web.Response:
+    state: FixtureState = request.app["state"]
+    question = state.questions[int(request.query["id"])]
+    return _cp1251_page(
+        f"<h1>{escape(question.text)}</h1>"
+        f'<div id="prav_id">{escape(question.options[question.correct])}</div>'
+    )
+
+
+def create_app(state: FixtureState) -> web.Application:
+    app = web.Application(middlewares=[latency_middleware])
+    app["state"] = state
+    app.router.add_get("/static/{name}", static_asset)
+    app.router.add_get("/portal/", portal_index)
+    app.router.add_get("/portal/spo", portal_spo)
+    app.router.add_get("/portal/spo/specialties", portal_specialties)
+    app.router.add_get("/selftest/", selftest_index)
+    app.router.add_post("/selftest/login", selftest_login)
+    app.router.add_get("/selftest/home", selftest_home)
+    app.router.add_get("/selftest/test", selftest_test)
+    app.router.add_get("/selftest/api/question", selftest_question)
+    app.router.add_post("/selftest/api/answer", selftest_answer)
+    app.router.add_get("/answers/search.html", answers_search)
+    app.router.add_get("/answers/vopros.html", answers_question)
+    return app
+
+
+async def start_fixture_site(state: FixtureState, host: str = "127.0.0.1", port: int = 0):
+    """Запускает заглушку и возвращает (runner, базовый URL)."""
+    runner = web.AppRunner(create_app(state), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+if __name__ == "__main__":
+    fixture_state = FixtureState(questions=generate_questions(80))
+    web.run_app(create_app(fixture_state), host="127.0.0.1", port=8080)
@@ -0,0 +1,214 @@
+"""Офлайн-бенчмарк прогона теста на локальных заглушках сайтов.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.run_benchmark --users 4 --questions 80 --latency 50
+
+Поднимает benchmarks.fixture_site, временную БД с учетными данными
+пользователей и те же сервисы, что и main.py (BrowserPool, AnswerBank,
+HttpAnswerSource, WaitStrategy), после чего запускает --users
+одновременных start_testing_process без Telegram. В конце печатает
+пропускную способность, p50/p95 времени на вопрос (стадия
+"question: total"), точность ответов по данным заглушки, пиковый RSS
+процесса вместе с браузерами и сводку по стадиям.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import tempfile
+import time
+
+from database.sqlite import Database
+from services.answer_source import HttpAnswerSource
+from services.browser_pool import BrowserPool
+from services.metrics import metrics, STAGE_METRIC
+from services.resource_filter import ResourceFilter
+from services.screenshots import Verbosity
+from services.step_timeouts import StepTimeouts
+from services.wait_strategy import WaitStrategy
+from utils.answer_bank import AnswerBank
+from utils.test_utils import start_testing_process
+from benchmarks.fixture_site import FixtureState, generate_questions, start_fixture_site
+
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def process_tree_rss() -> int:
+    """RSS текущего процесса и всех потомков (Chromium) в байтах."""
+    total, stack = 0, [os.getpid()]
+    while stack:
+        pid = stack.pop()
+        total += _rss(pid)
+        stack.extend(_children(pid))
+    return total
+
+
+async def sample_peak_rss(peak: dict, interval: float = 0.5):
+    while True:
+        peak["rss"] = max(peak["rss"], process_tree_rss())
+        await asyncio.sleep(interval)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк прогона теста")
+    parser.add_argument("--users", type=int, default=2, help="одновременных прогонов")
+    parser.add_argument("--questions", type=int, default=80, help="вопросов в тесте заглушки")
+    parser.add_argument("--latency", type=float, default=0, help="задержка сайтов, мс")
+    parser.add_argument("--answer-latency", type=float, default=None,
+                        help="задержка сайта ответов, мс (по умолчанию как --latency)")
+    parser.add_argument("--browsers", type=int, default=1, help="браузеров в пуле")
+    parser.add_argument("--contexts", type=int, default=4, help="контекстов на браузер")
+    parser.add_argument("--prefill", type=float, default=0.0,
+                        help="доля вопросов, заранее записанных в банк ответов")
+    parser.add_argument("--no-resource-filter", action="store_true",
+                        help="не блокировать картинки и шрифты")
+    parser.add_argument("--wait-timeout", type=int, default=5000, help="WAIT_TIMEOUT_MS")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    questions = generate_questions(args.questions, args.seed)
+    state = FixtureState(
+        questions=questions,
+        latency_ms=args.latency,
+        answer_latency_ms=args.latency if args.answer_latency is None else args.answer_latency
+    )
+    fixture_runner, fixture_url = await start_fixture_site(state)
+
+    workdir = tempfile.TemporaryDirectory()
+    database = Database(os.path.join(workdir.name, "bench.db"))
+    await database.connect()
+    browser_pool = BrowserPool(max_browsers=args.browsers, max_contexts=args.contexts)
+    answer_source = HttpAnswerSource(base_url=f"{fixture_url}/answers/")
+    peak = {"rss": 0}
+    sampler = asyncio.create_task(sample_peak_rss(peak))
+
+    try:
+        for user_id in range(1, args.users + 1):
+            await database.save_user_credentials(user_id, f"user{user_id}", "password")
+
+        answer_bank = AnswerBank(database)
+        for question in questions[:int(len(questions) * args.prefill)]:
+            await answer_bank.put(question.text, question.options[question.correct])
+        await answer_bank.load()
+
+        await browser_pool.start()
+        await answer_source.start()
+        metrics.reset()
+
+        wait_strategy = WaitStrategy(timeout_ms=args.wait_timeout)
+        step_timeouts = StepTimeouts(ceiling_ms=args.wait_timeout)
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            start_testing_process(
+                user_id=user_id,
+                db=database,
+                test_url=f"{fixture_url}/selftest/test",
+                browser_pool=browser_pool,
+                answer_bank=answer_bank,
+                answer_source=answer_source,
+                wait_strategy=wait_strategy,
+                step_timeouts=step_timeouts,
+                # Без allow_domains: фильтр работает через CDP, как в боте,
+                # и кэш контекста не отключается
+                resource_filter=ResourceFilter(enabled=not args.no_resource_filter),
+                screenshot_verbosity=Verbosity.NONE,
+                site_urls={
+                    "portal_url": f"{fixture_url}/portal/",
+                    "base_url": f"{fixture_url}/selftest/",
+                    "answers_url": f"{fixture_url}/answers/"
+                }
+            )
+            for user_id in range(1, args.users + 1)
+        ])
+        elapsed = time.perf_counter() - started
+    finally:
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+        await answer_source.close()
+        await browser_pool.close()
+        await database.close()
+        await fixture_runner.cleanup()
+        workdir.cleanup()
+
+    errors = [result["error"] for result in results if "error" in result]
+    answered = sum(result.get("total", 0) for result in results)
+    scored = sum(state.score(session) for session in state.answers)
+    # За прогон заглушка засчитывает не больше одного ответа на вопрос
+    possible = len(state.answers) * len(questions)
+    per_question = metrics.histograms.get((STAGE_METRIC, (("stage", "question: total"),)))
+
+    return {
+        "elapsed": elapsed,
+        "runs": len(results) - len(errors),
+        "errors": errors,
+        "questions": answered,
+        "throughput": answered / elapsed if elapsed else 0.0,
+        "p50": per_question.quantile(0.5) if per_question else 0.0,
+        "p95": per_question.quantile(0.95) if per_question else 0.0,
+        "accuracy": scored / possible if possible else 0.0,
+        "blocked": int(sum(
+            value for (name, _), value in metrics.counters.items() if name == "blocked_requests_total"
+        )),
+        # Загрузок кэшируемого скрипта на прогон: ~1 при работающем кэше
+        "script_loads": state.asset_requests["app.js"] / len(results) if results else 0.0,
+        "peak_rss": max(peak["rss"], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    }
+
+
+def print_report(report: dict):
+    print(f"Прогонов: {report['runs']}, ошибок: {len(report['errors'])}, "
+          f"время: {report['elapsed']:.1f} с")
+    for error in report["errors"]:
+        print(f"  ❌ {error}")
+    print(f"Вопросов: {report['questions']}, пропускная способность: "
+          f"{report['throughput']:.2f} вопр/с")
+    print(f"Время на вопрос: p50 {report['p50'] * 1000:.0f} мс, p95 {report['p95'] * 1000:.0f} мс")
+    print(f"Точность: {report['accuracy']:.1%}")
+    print(f"Заблокировано запросов: {report['blocked']}")
+    print(f"Загрузок кэшируемого скрипта на прогон: {report['script_loads']:.1f}")
+    print(f"Пиковый RSS: {report['peak_rss'] / 2 ** 20:.0f} МБ")
+    print()
+    print(f"{'стадия':<45} {'n':>6} {'avg, мс':>9} {'p50, мс':>9} {'p95, мс':>9} {'ошибки':>7}")
+    for row in metrics.stage_summary():
+        print(f"{row['stage']:<45} {row['count']:>6} {row['avg'] * 1000:>9.1f} "
+              f"{row['p50'] * 1000:>9.1f} {row['p95'] * 1000:>9.1f} {row['errors']:>7}")
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+    )
+    # web_handler настраивает корневой логгер при импорте, поэтому уровень
+    # выставляем явно
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    print_report(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
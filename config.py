@@ -1,23 +1,123 @@
-from dataclasses import dataclass
+import logging
+
+from dataclasses import dataclass, field
+from typing import MutableMapping
 from environs import Env
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class DatabaseConfig:
     database: str
+    subscription_cache_size: int
+    subscription_negative_ttl: float
+    fsm_ttl: int
+    fsm_flush_interval: float
+    fsm_cache_size: int
 
 @dataclass
 class TgBot:
     token: str
     admin_ids: list[int]
+    # Множество для проверки прав на каждом апдейте, порядок хранит admin_ids
+    admin_set: frozenset[int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.admin_set = frozenset(self.admin_ids)
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.admin_set
+
+@dataclass
+class BrowserConfig:
+    max_browsers: int
+    max_contexts: int
+    recycle_after: int
+
+@dataclass
+class WorkerConfig:
+    # 0 - прогоны в процессе бота
+    processes: int
+
+@dataclass
+class WaitConfig:
+    timeout_ms: int
+    fallback_networkidle: bool
+    fallback_sleep_ms: int
+
+@dataclass
+class TimeoutConfig:
+    step_floor_ms: int
+    step_ceiling_ms: int
+    step_multiplier: float
+    run_deadline_s: float
+
+@dataclass
+class QueueConfig:
+    workers: int
+    max_queued: int
+    max_per_user: int
+
+@dataclass
+class ScreenshotConfig:
+    verbosity: str
+    image_format: str
+    quality: int
+    scale: float
+
+@dataclass
+class MetricsConfig:
+    host: str
+    port: int
+
+@dataclass
+class SitesConfig:
+    portal_url: str
+    testing_url: str
+    answers_url: str
+
+@dataclass
+class ResourceFilterConfig:
+    enabled: bool
+    block_types: list[str]
+    block_domains: list[str]
+    allow_domains: list[str]
+
+@dataclass
+class WebhookConfig:
+    # Пустой url - режим long polling
+    url: str
+    path: str
+    host: str
+    port: int
+    secret: str
+    max_concurrent: int
+    drain_timeout: float
 
 @dataclass
 class Config:
     tg_bot: TgBot
     db: DatabaseConfig
+    browser: BrowserConfig
+    workers: WorkerConfig
+    wait: WaitConfig
+    timeouts: TimeoutConfig
+    queue: QueueConfig
+    screenshots: ScreenshotConfig
+    metrics: MetricsConfig
+    sites: SitesConfig
+    resources: ResourceFilterConfig
+    webhook: WebhookConfig
 
-def load_config(path: str = None) -> Config:
+def load_config(path: str = None, override: bool = False) -> Config:
+    """Читает конфигурацию из окружения и .env.
+
+    Вызывается один раз при старте. При горячей перезагрузке передается
+    override=True, чтобы значения из .env заменили уже загруженные в
+    окружение процесса.
+    """
     env = Env()
-    env.read_env(path)
+    env.read_env(path, override=override)
     
     return Config(
         tg_bot=TgBot(
@@ -25,6 +125,82 @@ def load_config(path: str = None) -> Config:
             admin_ids=list(map(int, env.list("ADMIN_IDS")))
         ),
         db=DatabaseConfig(
-            database=env.str("DATABASE")
+            database=env.str("DATABASE"),
+            subscription_cache_size=env.int("SUBSCRIPTION_CACHE_SIZE", 10000),
+            subscription_negative_ttl=env.float("SUBSCRIPTION_NEGATIVE_TTL_S", 60),
+            fsm_ttl=env.int("FSM_STATE_TTL_S", 86400),
+            fsm_flush_interval=env.float("FSM_FLUSH_INTERVAL_S", 1.0),
+            fsm_cache_size=env.int("FSM_CACHE_SIZE", 10000)
+        ),
+        browser=BrowserConfig(
+            max_browsers=env.int("BROWSER_POOL_SIZE", 1),
+            max_contexts=env.int("BROWSER_MAX_CONTEXTS", 4),
+            recycle_after=env.int("BROWSER_RECYCLE_AFTER", 50)
+        ),
+        workers=WorkerConfig(
+            processes=env.int("WORKER_PROCESSES", 0)
+        ),
+        wait=WaitConfig(
+            timeout_ms=env.int("WAIT_TIMEOUT_MS", 15000),
+            fallback_networkidle=env.bool("WAIT_FALLBACK_NETWORKIDLE", False),
+            fallback_sleep_ms=env.int("WAIT_FALLBACK_SLEEP_MS", 0)
+        ),
+        timeouts=TimeoutConfig(
+            step_floor_ms=env.int("STEP_TIMEOUT_MIN_MS", 2000),
+            step_ceiling_ms=env.int("STEP_TIMEOUT_MAX_MS", 15000),
+            step_multiplier=env.float("STEP_TIMEOUT_MULTIPLIER", 3.0),
+            run_deadline_s=env.float("RUN_DEADLINE_S", 900)
+        ),
+        queue=QueueConfig(
+            workers=env.int("TEST_WORKERS", 2),
+            max_queued=env.int("TEST_QUEUE_SIZE", 100),
+            max_per_user=env.int("TEST_QUEUE_PER_USER", 1)
+        ),
+        screenshots=ScreenshotConfig(
+            verbosity=env.str("SCREENSHOT_VERBOSITY", "milestones"),
+            image_format=env.str("SCREENSHOT_FORMAT", "jpeg"),
+            quality=env.int("SCREENSHOT_QUALITY", 70),
+            scale=env.float("SCREENSHOT_SCALE", 0.5)
+        ),
+        metrics=MetricsConfig(
+            host=env.str("METRICS_HOST", "127.0.0.1"),
+            # 0 - сервер метрик выключен
+            port=env.int("METRICS_PORT", 0)
+        ),
+        sites=SitesConfig(
+            portal_url=env.str("PORTAL_URL", "https://fmza.ru"),
+            testing_url=env.str("TESTING_URL", "http://selftest-mpe.mededtech.ru"),
+            answers_url=env.str("ANSWERS_URL", "https://www.tests-exam.ru/")
+        ),
+        resources=ResourceFilterConfig(
+            enabled=env.bool("RESOURCE_FILTER", True),
+            block_types=env.list("RESOURCE_BLOCK_TYPES", ["image", "media", "font"]),
+            # Дополняют встроенный список счетчиков и трекеров
+            block_domains=env.list("RESOURCE_BLOCK_DOMAINS", []),
+            allow_domains=env.list("RESOURCE_ALLOW_DOMAINS", [])
+        ),
+        webhook=WebhookConfig(
+            url=env.str("WEBHOOK_URL", ""),
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            host=env.str("WEBHOOK_HOST", "0.0.0.0"),
+            port=env.int("WEBHOOK_PORT", 8080),
+            secret=env.str("WEBHOOK_SECRET", None),
+            max_concurrent=env.int("WEBHOOK_MAX_CONCURRENCY", 50),
+            drain_timeout=env.float("WEBHOOK_DRAIN_TIMEOUT", 30)
         )
     )
+
+
+def reload_config(workflow_data: MutableMapping, source: str) -> Exception | None:
+    """Перечитывает конфигурацию и подменяет ее в данных диспетчера.
+
+    Общая точка для SIGHUP и /reload_config. При ошибке чтения прежняя
+    конфигурация остается в силе, ошибка пишется в лог и возвращается.
+    """
+    try:
+        workflow_data["config"] = load_config(override=True)
+    except Exception as e:
+        logger.error(f"❌ Не удалось перечитать конфигурацию: {e}")
+        return e
+    logger.info(f"✅ Конфигурация перечитана ({source})")
+    return None
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.sqlite import Database
+from services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_INTERVAL = 600
+
+
+@dataclass
+class _Record:
+    state: str | None = None
+    data: dict = field(default_factory=dict)
+    updated: float = field(default_factory=time.monotonic)
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в SQLite проекта с горячим слоем в памяти.
+
+    Чтение идет из кэша, промах загружает запись из fsm_states.
+    Изменения только помечают запись грязной: фоновая задача раз в
+    flush_interval секунд пишет все грязные записи одной транзакцией,
+    поэтому несколько update_data подряд дают одну запись на диск.
+    Состояние без изменений дольше ttl секунд считается пустым и
+    удаляется. Кэш ограничен max_cached записями, вытесняются только
+    уже сохраненные.
+    """
+
+    def __init__(self, database: Database, ttl: int = 86400, flush_interval: float = 1.0,
+                 max_cached: int = 10_000):
+        self.database = database
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_cached = max_cached
+        self._cache: OrderedDict[str, _Record] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = (
+            key.bot_id, key.chat_id, key.user_id,
+            getattr(key, "thread_id", None), getattr(key, "business_connection_id", None),
+            key.destiny
+        )
+        return ":".join("" if part is None else str(part) for part in parts)
+
+    def _expired(self, record: _Record) -> bool:
+        return time.monotonic() - record.updated > self.ttl
+
+    async def _record(self, key: StorageKey) -> _Record:
+        storage_key = self._key(key)
+        record = self._cache.get(storage_key)
+        if record is not None and self._expired(record):
+            record.state, record.data = None, {}
+            self._mark(storage_key, record)
+        if record is None:
+            metrics.inc("fsm_storage_lookups_total", result="miss")
+            row = await self.database.get_fsm_record(storage_key, self.ttl)
+            record = self._cache.get(storage_key)
+            if record is None:
+                record = _Record()
+                if row:
+                    record.state, record.data = row[0], json.loads(row[1]) if row[1] else {}
+                    # Срок жизни отсчитывается от последней записи в базу
+                    record.updated = time.monotonic() - row[2]
+                self._cache[storage_key] = record
+                self._evict()
+        else:
+            metrics.inc("fsm_storage_lookups_total", result="hit")
+        self._cache.move_to_end(storage_key)
+        return record
+
+    def _mark(self, storage_key: str, record: _Record):
+        record.updated = time.monotonic()
+        self._dirty.add(storage_key)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    def _evict(self):
+        overflow = len(self._cache) - self.max_cached
+        if overflow <= 0:
+            return
+        for storage_key in list(self._cache):
+            if overflow <= 0:
+                break
+            if storage_key not in self._dirty:
+                del self._cache[storage_key]
+                overflow -= 1
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark(self._key(key), record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        record = await self._record(key)
+        record.data = dict(data)
+        self._mark(self._key(key), record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._record(key)).data)
+
+    async def flush(self):
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            records = []
+            for storage_key in dirty:
+                record = self._cache.get(storage_key)
+                if record is None:
+                    continue
+                empty = record.state is None and not record.data
+                records.append((
+                    storage_key,
+                    record.state,
+                    None if empty else json.dumps(record.data, ensure_ascii=False)
+                ))
+            try:
+                await self.database.save_fsm_records(records)
+            except Exception as e:
+                # Не потерять изменения: повторим при следующем сбросе
+                logger.error(f"❌ Ошибка при сохранении состояний FSM: {e}")
+                self._dirty |= dirty
+                return
+            except asyncio.CancelledError:
+                self._dirty |= dirty
+                raise
+            if records:
+                metrics.inc("fsm_storage_flushes_total")
+                metrics.inc("fsm_storage_records_written_total", len(records))
+            self._evict()
+
+    async def cleanup(self):
+        for storage_key, record in list(self._cache.items()):
+            if storage_key not in self._dirty and self._expired(record):
+                del self._cache[storage_key]
+        await self.database.delete_expired_fsm_records(self.ttl)
+
+    async def _flush_loop(self):
+        last_cleanup = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._dirty:
+                await self.flush()
+            if time.monotonic() - last_cleanup > CLEANUP_INTERVAL:
+                last_cleanup = time.monotonic()
+                try:
+                    await self.cleanup()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при очистке состояний FSM: {e}")
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Последние изменения сохраняем до закрытия базы
+        await self.flush()
@@ -1,16 +1,132 @@
-import sqlite3
+import asyncio
+import logging
+import aiosqlite
+from contextlib import asynccontextmanager
 from typing import List, Dict
 from datetime import datetime
+from utils.subscription_cache import SubscriptionCache
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+# Изменения схемы поверх CREATE TABLE: миграция N выполняется один раз,
+# номер последней примененной хранится в PRAGMA user_version
+MIGRATIONS = (
+    # 1: индексы для выборок по пользователю и очистки состояний FSM
+    (
+        "CREATE INDEX IF NOT EXISTS idx_test_results_user ON test_results (user_id, test_date)",
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at)",
+    ),
+    # 2: статистика пользователя ведется в users при сохранении результата
+    (
+        "ALTER TABLE users ADD COLUMN best_score REAL DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN last_test_date TIMESTAMP",
+        "INSERT OR IGNORE INTO users (user_id) SELECT DISTINCT user_id FROM test_results",
+        """
+            UPDATE users SET (tests_completed, average_score, best_score, last_test_date) = (
+                SELECT COUNT(*), COALESCE(AVG(score), 0), COALESCE(MAX(score), 0), MAX(test_date)
+                FROM test_results WHERE test_results.user_id = users.user_id
+            )
+        """,
+    ),
+)
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    return datetime.strptime(value, TIMESTAMP_FORMAT) if value else None
+
+def _subscription_details(end_date: datetime | None, subscription_type: str | None) -> dict:
+    if not end_date:
+        return {"active": False, "end_date": None, "type": None, "time_left": None}
+
+    return {
+        "active": True,
+        "end_date": end_date,
+        "type": subscription_type,
+        "time_left": end_date - datetime.now()
+    }
 
 class Database:
-    def __init__(self, db_path: str):
+    """Асинхронная обертка над SQLite.
+
+    Один пишущий коннект (записи сериализуются блокировкой) и несколько
+    читающих - в режиме WAL чтение не ждет запись. Подготовленные
+    выражения кэшируются самим sqlite3 на каждом соединении
+    (cached_statements), поэтому SQL держится в виде констант.
+    """
+
+    def __init__(self, db_path: str, readers: int = 3, subscription_cache_size: int = 10_000,
+                 subscription_negative_ttl: float = 60):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
-        self._create_tables()
-    
-    def _create_tables(self):
-        self.cursor.execute("""
+        self.readers = max(1, readers)
+        # Подписки читаются на каждый /start, а меняются только в add_subscription
+        self.subscriptions = SubscriptionCache(subscription_cache_size, subscription_negative_ttl)
+        self._writer: aiosqlite.Connection = None
+        self._write_lock = asyncio.Lock()
+        self._reader_pool: asyncio.Queue = None
+        self._connections: list[aiosqlite.Connection] = []
+
+    async def _open(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        self._connections.append(conn)
+        return conn
+
+    async def connect(self):
+        self._writer = await self._open()
+        await self._create_tables()
+        await self._migrate()
+
+        self._reader_pool = asyncio.Queue()
+        for _ in range(self.readers):
+            self._reader_pool.put_nowait(await self._open())
+
+    async def close(self):
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+        self._writer = None
+
+    @asynccontextmanager
+    async def _reader(self):
+        conn = await self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put_nowait(conn)
+
+    async def _fetchone(self, sql: str, params: tuple = ()) -> tuple | None:
+        async with self._reader() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchone()
+
+    async def _fetchall(self, sql: str, params: tuple = ()) -> list[tuple]:
+        async with self._reader() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+
+    async def _write(self, *statements: tuple[str, tuple]):
+        # Все выражения выполняются в одной транзакции
+        async with self._write_lock:
+            try:
+                for sql, params in statements:
+                    await self._writer.execute(sql, params)
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+
+    async def _create_tables(self):
+        await self._writer.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY,
                 username TEXT,
@@ -20,8 +136,8 @@ class Database:
                 average_score REAL DEFAULT 0
             )
         """)
-        
-        self.cursor.execute("""
+
+        await self._writer.execute("""
             CREATE TABLE IF NOT EXISTS test_results (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
@@ -32,8 +148,8 @@ class Database:
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
         """)
-        
-        self.cursor.execute("""
+
+        await self._writer.execute("""
             CREATE TABLE IF NOT EXISTS requisites (
                 card_number TEXT,
                 sbp TEXT,
@@ -41,8 +157,8 @@ class Database:
                 holder_name TEXT
             )
         """)
-        
-        self.cursor.execute("""
+
+        await self._writer.execute("""
             CREATE TABLE IF NOT EXISTS subscriptions (
                 user_id INTEGER PRIMARY KEY,
                 start_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -50,91 +166,276 @@ class Database:
                 subscription_type TEXT
             )
         """)
-        self.conn.commit()
-    
-    def save_user_credentials(self, user_id: int, login: str, password: str):
-        self.cursor.execute("""
-            INSERT OR REPLACE INTO users (user_id, site_login, site_password)
-            VALUES (?, ?, ?)
-        """, (user_id, login, password))
-        self.conn.commit()
-    
-    def get_user_credentials(self, user_id: int) -> tuple:
-        self.cursor.execute("""
+
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS answer_bank (
+                question_key TEXT PRIMARY KEY,
+                question_text TEXT,
+                answer_text TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                user_id INTEGER PRIMARY KEY,
+                storage_state TEXT,
+                expires_at TIMESTAMP
+            )
+        """)
+
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS run_checkpoints (
+                user_id INTEGER,
+                test_url TEXT,
+                question_index INTEGER,
+                letter TEXT,
+                match_score INTEGER,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, test_url, question_index)
+            )
+        """)
+
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                storage_key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        await self._writer.commit()
+
+    async def _migrate(self):
+        for number, statements in enumerate(MIGRATIONS, start=1):
+            # IMMEDIATE: версию проверяет и повышает только один процесс
+            await self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                async with self._writer.execute("PRAGMA user_version") as cursor:
+                    (version,) = await cursor.fetchone()
+                if version >= number:
+                    await self._writer.rollback()
+                    continue
+                for sql in statements:
+                    await self._writer.execute(sql)
+                await self._writer.execute(f"PRAGMA user_version = {number}")
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+            logger.info(f"✅ Схема БД обновлена до версии {number}")
+
+    async def save_user_credentials(self, user_id: int, login: str, password: str):
+        await self._write(
+            ("""
+                INSERT INTO users (user_id, site_login, site_password)
+                VALUES (?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    site_login = excluded.site_login,
+                    site_password = excluded.site_password
+            """, (user_id, login, password)),
+            # Сохраненная сессия относится к старой учетной записи
+            ("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        )
+
+    async def get_user_credentials(self, user_id: int) -> tuple:
+        return await self._fetchone("""
             SELECT site_login, site_password FROM users WHERE user_id = ?
         """, (user_id,))
-        return self.cursor.fetchone()
-    
-    def save_test_result(self, user_id: int, score: int, correct: int, total: int):
-        self.cursor.execute("""
-            INSERT INTO test_results (user_id, score, correct_answers, total_questions)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, score, correct, total))
-        self.conn.commit()
-    
-    def get_user_statistics(self, user_id: int) -> dict:
-        self.cursor.execute("""
-            SELECT 
-                COUNT(*) as total_tests,
-                AVG(score) as average_score,
-                MAX(score) as best_score,
-                MAX(test_date) as last_test_date
-            FROM test_results 
-            WHERE user_id = ?
+
+    async def save_test_result(self, user_id: int, score: int, correct: int, total: int):
+        # Результат и агрегаты пользователя меняются в одной транзакции
+        await self._write(
+            ("""
+                INSERT INTO test_results (user_id, score, correct_answers, total_questions)
+                VALUES (?, ?, ?, ?)
+            """, (user_id, score, correct, total)),
+            ("""
+                INSERT INTO users (user_id, tests_completed, average_score, best_score, last_test_date)
+                VALUES (?, 1, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    tests_completed = tests_completed + 1,
+                    average_score = (average_score * tests_completed + excluded.average_score)
+                        / (tests_completed + 1),
+                    best_score = MAX(best_score, excluded.best_score),
+                    last_test_date = excluded.last_test_date
+            """, (user_id, score, score))
+        )
+
+    async def get_user_statistics(self, user_id: int) -> dict:
+        row = await self._fetchone("""
+            SELECT tests_completed, average_score, best_score, last_test_date
+            FROM users WHERE user_id = ?
         """, (user_id,))
-        
-        row = self.cursor.fetchone()
+        if not row or not row[0]:
+            row = (0, 0, 0, None)
+
         return {
             "total_tests": row[0],
             "average_score": round(row[1] or 0, 2),
             "best_score": round(row[2] or 0, 2),
             "last_test_date": row[3] or "Нет данных"
         }
-    
-    def save_requisites(self, card_number: str, sbp: str, bank: str, holder_name: str):
-        self.cursor.execute("DELETE FROM requisites")  # Удаляем старые реквизиты
-        self.cursor.execute("""
-            INSERT INTO requisites (card_number, sbp, bank, holder_name)
-            VALUES (?, ?, ?, ?)
-        """, (card_number, sbp, bank, holder_name))
-        self.conn.commit()
-
-    def get_requisites(self) -> tuple:
-        self.cursor.execute("SELECT card_number, sbp, bank, holder_name FROM requisites")
-        return self.cursor.fetchone() or (None, None, None, None)
-
-    def add_subscription(self, user_id: int, days: int, subscription_type: str):
-        self.cursor.execute("""
+
+    async def save_requisites(self, card_number: str, sbp: str, bank: str, holder_name: str):
+        await self._write(
+            ("DELETE FROM requisites", ()),  # Удаляем старые реквизиты
+            ("""
+                INSERT INTO requisites (card_number, sbp, bank, holder_name)
+                VALUES (?, ?, ?, ?)
+            """, (card_number, sbp, bank, holder_name))
+        )
+
+    async def get_requisites(self) -> tuple:
+        row = await self._fetchone("SELECT card_number, sbp, bank, holder_name FROM requisites")
+        return row or (None, None, None, None)
+
+    async def add_subscription(self, user_id: int, days: int, subscription_type: str):
+        await self._write(("""
             INSERT OR REPLACE INTO subscriptions (user_id, end_date, subscription_type)
             VALUES (?, datetime('now', '+' || ? || ' days'), ?)
-        """, (user_id, days, subscription_type))
-        self.conn.commit()
+        """, (user_id, days, subscription_type)))
+        self.subscriptions.invalidate(user_id)
 
-    def get_subscription(self, user_id: int) -> dict:
-        self.cursor.execute("""
+    async def _load_subscription(self, user_id: int) -> tuple[datetime | None, str | None]:
+        cached = self.subscriptions.get(user_id)
+        if cached is not None:
+            return cached
+        row = await self._fetchone("""
             SELECT end_date, subscription_type FROM subscriptions
             WHERE user_id = ? AND end_date > datetime('now')
         """, (user_id,))
-        row = self.cursor.fetchone()
-        return {"active": bool(row), "end_date": row[0] if row else None, "type": row[1] if row else None}
+        end_date, subscription_type = (_parse_timestamp(row[0]), row[1]) if row else (None, None)
+        self.subscriptions.put(user_id, end_date, subscription_type)
+        return end_date, subscription_type
 
-    def get_subscription_details(self, user_id: int) -> dict:
-        self.cursor.execute("""
-            SELECT end_date, subscription_type 
-            FROM subscriptions 
-            WHERE user_id = ? AND end_date > datetime('now')
+    async def get_subscription(self, user_id: int) -> dict:
+        end_date, subscription_type = await self._load_subscription(user_id)
+        return {
+            "active": bool(end_date),
+            "end_date": end_date.strftime(TIMESTAMP_FORMAT) if end_date else None,
+            "type": subscription_type
+        }
+
+    async def get_subscription_details(self, user_id: int) -> dict:
+        return _subscription_details(*await self._load_subscription(user_id))
+
+    async def get_user_context(self, user_id: int) -> dict:
+        """Учетные данные и активная подписка пользователя одним запросом."""
+        cached = self.subscriptions.get(user_id)
+        if cached is not None:
+            row = await self._fetchone("""
+                SELECT site_login IS NOT NULL AND site_password IS NOT NULL
+                FROM users WHERE user_id = ?
+            """, (user_id,))
+            return {
+                "has_credentials": bool(row and row[0]),
+                "subscription": _subscription_details(*cached)
+            }
+
+        row = await self._fetchone("""
+            SELECT
+                u.site_login IS NOT NULL AND u.site_password IS NOT NULL,
+                s.end_date,
+                s.subscription_type
+            FROM (SELECT ? AS user_id) AS q
+            LEFT JOIN users u ON u.user_id = q.user_id
+            LEFT JOIN subscriptions s ON s.user_id = q.user_id AND s.end_date > datetime('now')
         """, (user_id,))
-        row = self.cursor.fetchone()
-        
-        if not row:
-            return {"active": False, "end_date": None, "type": None, "time_left": None}
-            
-        end_date = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S')
-        time_left = end_date - datetime.now()
-        
+        end_date = _parse_timestamp(row[1])
+        self.subscriptions.put(user_id, end_date, row[2])
         return {
-            "active": True,
-            "end_date": end_date,
-            "type": row[1],
-            "time_left": time_left
+            "has_credentials": bool(row[0]),
+            "subscription": _subscription_details(end_date, row[2])
         }
+
+    async def get_bank_answer(self, question_key: str) -> str | None:
+        row = await self._fetchone("""
+            SELECT answer_text FROM answer_bank WHERE question_key = ?
+        """, (question_key,))
+        return row[0] if row else None
+
+    async def save_bank_answer(self, question_key: str, question_text: str, answer_text: str):
+        await self._write(("""
+            INSERT OR REPLACE INTO answer_bank (question_key, question_text, answer_text, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, (question_key, question_text, answer_text)))
+
+    async def get_bank_questions(self) -> List[str]:
+        rows = await self._fetchall("SELECT question_key FROM answer_bank")
+        return [row[0] for row in rows]
+
+    async def save_session(self, user_id: int, storage_state: str, ttl_hours: int = 12):
+        await self._write(("""
+            INSERT OR REPLACE INTO sessions (user_id, storage_state, expires_at)
+            VALUES (?, ?, datetime('now', '+' || ? || ' hours'))
+        """, (user_id, storage_state, ttl_hours)))
+
+    async def get_session(self, user_id: int) -> str | None:
+        row = await self._fetchone("""
+            SELECT storage_state FROM sessions
+            WHERE user_id = ? AND expires_at > datetime('now')
+        """, (user_id,))
+        return row[0] if row else None
+
+    async def delete_session(self, user_id: int):
+        await self._write(("DELETE FROM sessions WHERE user_id = ?", (user_id,)))
+
+    async def save_checkpoint(self, user_id: int, test_url: str, question_index: int,
+                              letter: str | None, match_score: int | None):
+        await self._write(("""
+            INSERT OR REPLACE INTO run_checkpoints
+                (user_id, test_url, question_index, letter, match_score, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (user_id, test_url, question_index, letter, match_score)))
+
+    async def get_checkpoints(self, user_id: int, test_url: str,
+                              max_age_hours: int = 12) -> Dict[int, tuple]:
+        rows = await self._fetchall("""
+            SELECT question_index, letter, match_score FROM run_checkpoints
+            WHERE user_id = ? AND test_url = ? AND (
+                SELECT MAX(updated_at) FROM run_checkpoints WHERE user_id = ? AND test_url = ?
+            ) > datetime('now', '-' || ? || ' hours')
+        """, (user_id, test_url, user_id, test_url, max_age_hours))
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    async def delete_checkpoints(self, user_id: int, test_url: str):
+        await self._write((
+            "DELETE FROM run_checkpoints WHERE user_id = ? AND test_url = ?",
+            (user_id, test_url)
+        ))
+
+    async def get_unfinished_runs(self, max_age_hours: int = 12) -> List[tuple]:
+        rows = await self._fetchall("""
+            SELECT user_id, test_url FROM run_checkpoints
+            GROUP BY user_id, test_url
+            HAVING MAX(updated_at) > datetime('now', '-' || ? || ' hours')
+        """, (max_age_hours,))
+        return [(row[0], row[1]) for row in rows]
+
+    async def get_fsm_record(self, storage_key: str, ttl_seconds: int) -> tuple | None:
+        return await self._fetchone("""
+            SELECT state, data, (julianday('now') - julianday(updated_at)) * 86400
+            FROM fsm_states
+            WHERE storage_key = ? AND updated_at > datetime('now', '-' || ? || ' seconds')
+        """, (storage_key, ttl_seconds))
+
+    async def save_fsm_records(self, records: List[tuple]):
+        # Пустое состояние без данных удаляется, остальное пишется одной транзакцией
+        statements = []
+        for storage_key, state, data in records:
+            if state is None and data is None:
+                statements.append(("DELETE FROM fsm_states WHERE storage_key = ?", (storage_key,)))
+            else:
+                statements.append(("""
+                    INSERT OR REPLACE INTO fsm_states (storage_key, state, data, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (storage_key, state, data)))
+        if statements:
+            await self._write(*statements)
+
+    async def delete_expired_fsm_records(self, ttl_seconds: int):
+        await self._write((
+            "DELETE FROM fsm_states WHERE updated_at <= datetime('now', '-' || ? || ' seconds')",
+            (ttl_seconds,)
+        ))
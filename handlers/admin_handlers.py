@@ -1,5 +1,5 @@
-from aiogram import Router, F
-from aiogram.filters import StateFilter
+from aiogram import Router, F, Dispatcher
+from aiogram.filters import BaseFilter, Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, CallbackQuery
@@ -7,11 +7,34 @@ from aiogram.utils.markdown import hbold
 from database.sqlite import Database
 from keyboards.reply import get_admin_keyboard, get_requisites_keyboard
 from utils.subscription import format_subscription_type
+from services.metrics import metrics
+from config import Config, reload_config
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+
+class AdminFilter(BaseFilter):
+    """Пропускает апдейты только от администраторов.
+
+    Config берется из данных диспетчера, поэтому список администраторов
+    учитывает перезагрузку конфигурации.
+    """
+
+    async def __call__(self, event: Message | CallbackQuery, config: Config) -> bool:
+        if config.tg_bot.is_admin(event.from_user.id):
+            return True
+        if isinstance(event, CallbackQuery):
+            # Иначе у нажавшего кнопку бесконечно крутится индикатор загрузки
+            await event.answer("⛔ Недостаточно прав")
+        return False
+
+
 router = Router()
+# Все обработчики роутера, включая шаги смены реквизитов, только для администраторов
+router.message.filter(AdminFilter())
+router.callback_query.filter(AdminFilter())
 
 class RequisitesStates(StatesGroup):
     waiting_for_card = State()
@@ -21,7 +44,7 @@ class RequisitesStates(StatesGroup):
 
 @router.callback_query(F.data == "requisites")
 async def show_requisites(callback: CallbackQuery, db: Database):
-    card_number, sbp, bank, holder = db.get_requisites()
+    card_number, sbp, bank, holder = await db.get_requisites()
     text = (
         f"{hbold('💳 Текущие реквизиты:')}\n\n"
         f"Номер карты: {card_number or 'Не указан'}\n"
@@ -63,7 +86,7 @@ async def process_bank(message: Message, state: FSMContext):
 @router.message(RequisitesStates.waiting_for_holder)
 async def process_holder(message: Message, state: FSMContext, db: Database):
     data = await state.get_data()
-    db.save_requisites(
+    await db.save_requisites(
         card_number=data['card'],
         sbp=data['sbp'],
         bank=data['bank'],
@@ -96,7 +119,7 @@ async def approve_payment(callback: CallbackQuery, db: Database):
             return
         
         # Добавляем подписку
-        db.add_subscription(user_id, days, duration)
+        await db.add_subscription(user_id, days, duration)
         
         await callback.bot.send_message(
             user_id,
@@ -126,3 +149,45 @@ async def reject_payment(callback: CallbackQuery):
     await callback.message.edit_text(
         f"❌ Оплата от пользователя {user_id} отклонена"
     )
+
+
+@router.message(Command("metrics"))
+async def cmd_metrics(message: Message):
+    summary = metrics.stage_summary()
+    if not summary:
+        await message.answer("📈 Метрик пока нет")
+        return
+    
+    lines = [f"📈 {hbold('Время этапов (p50 / p95 / ошибки):')}", ""]
+    for stage in summary:
+        lines.append(
+            f"{stage['stage']}: {stage['p50']:.2f}с / {stage['p95']:.2f}с / {stage['errors']} "
+            f"(n={stage['count']})"
+        )
+    
+    counters = {
+        dict(labels).get("result"): int(value)
+        for (name, labels), value in metrics.counters.items()
+        if name == "answer_bank_lookups_total"
+    }
+    if counters:
+        lines.append("")
+        lines.append(
+            f"Банк ответов: попаданий {counters.get('hit', 0)}, "
+            f"похожих {counters.get('fuzzy_hit', 0)}, промахов {counters.get('miss', 0)}"
+        )
+    
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command("reload_config"))
+async def cmd_reload_config(message: Message, dispatcher: Dispatcher):
+    error = reload_config(dispatcher, "команда администратора")
+    if error:
+        await message.answer(f"❌ Не удалось перечитать конфигурацию: {error}")
+        return
+    
+    await message.answer(
+        "✅ Конфигурация перечитана\n"
+        "Пулы браузеров, очередь и сервер метрик применят изменения после перезапуска"
+    )
@@ -5,9 +5,11 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.markdown import hbold
 from database.sqlite import Database
+from middlewares.user_context import UserContext
 from keyboards.reply import get_main_keyboard, get_settings_keyboard, get_admin_keyboard, get_subscription_keyboard
-from utils.test_utils import start_testing_process
-from config import load_config
+from services.test_queue import TestRunScheduler, TestJob, DuplicateJobError, QueueFullError
+from services.screenshots import Verbosity
+from config import Config
 from datetime import datetime, timedelta
 from utils.subscription import format_subscription_type
 
@@ -20,18 +22,17 @@ class UserAuth(StatesGroup):
     waiting_for_payment_screenshot = State()
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext, db: Database):
-    config = load_config()
-    is_admin = message.from_user.id in config.tg_bot.admin_ids
+async def cmd_start(message: Message, state: FSMContext, db: Database, user_context: UserContext):
+    is_admin = user_context.is_admin
     
-    # Получаем информацию о подписке и учетных данных для всех пользователей
-    subscription = db.get_subscription_details(message.from_user.id)
-    credentials = db.get_user_credentials(message.from_user.id)
+    # Подписка и наличие учетных данных уже загружены middleware одним запросом
+    subscription = user_context.subscription
+    credentials = user_context.has_credentials
     
     if not subscription["active"] and not is_admin:
         # Даем демо-доступ только обычным пользователям
-        db.add_subscription(message.from_user.id, 0.0208333, "demo")
-        subscription = db.get_subscription_details(message.from_user.id)
+        await db.add_subscription(message.from_user.id, 0.0208333, "demo")
+        subscription = await db.get_subscription_details(message.from_user.id)
     
     # Форматируем оставшееся время
     time_left = subscription["time_left"]
@@ -90,7 +91,7 @@ async def process_password(message: Message, state: FSMContext, db: Database):
     password = message.text
     
     # Сохраняем данные
-    db.save_user_credentials(message.from_user.id, login, password)
+    await db.save_user_credentials(message.from_user.id, login, password)
     
     await message.answer(
         "✅ Данные успешно сохранены!\n"
@@ -102,42 +103,54 @@ async def process_password(message: Message, state: FSMContext, db: Database):
 @router.callback_query(F.data == "start_test")
 async def start_test(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer(
-        "🔗 Пожалуйста, отправьте ссылку на начатый тест:"
+        "🔗 Пожалуйста, отправьте ссылку на начатый тест:\n"
+        "После ссылки через пробел можно указать скриншоты: "
+        "none, errors, milestones или all"
     )
     await state.set_state(UserAuth.waiting_for_test_url)
 
 @router.message(UserAuth.waiting_for_test_url)
-async def process_test_url(message: Message, state: FSMContext, db: Database):
+async def process_test_url(message: Message, state: FSMContext, scheduler: TestRunScheduler):
+    # "<ссылка> [уровень скриншотов]", без уровня - значение из конфига
+    test_url, _, level = (message.text or "").strip().partition(" ")
+    level = level.strip().upper()
+    if level and level not in Verbosity.__members__:
+        await message.answer(
+            "❌ Неизвестный уровень скриншотов, используйте none, errors, milestones или all"
+        )
+        return
     await state.clear()
-    await message.answer(
-        "🔄 Начинаю процесс тестирования...\n"
-        "Пожалуйста, подождите"
-    )
     
-    result = await start_testing_process(
+    job = TestJob(
         user_id=message.from_user.id,
-        db=db,
-        bot=message.bot,
-        test_url=message.text
+        test_url=test_url,
+        screenshot_verbosity=Verbosity[level] if level else None
     )
-    
-    if "error" in result:
+    # Только ставим тест в очередь, прогон выполнит воркер планировщика
+    try:
+        position = await scheduler.submit(job)
+    except DuplicateJobError:
         await message.answer(
-            f"❌ {result['error']}",
+            "⏳ Ваш тест уже в очереди или выполняется",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    except QueueFullError:
+        await message.answer(
+            "❌ Сейчас слишком много запросов, попробуйте позже",
             reply_markup=get_main_keyboard()
         )
         return
     
     await message.answer(
-        f"📊 Результат тестирования:\n"
-        f"Правильных ответов: {result['correct']}/{result['total']}\n"
-        f"Процент: {result['percentage']}%",
-        reply_markup=get_main_keyboard()
+        f"🕒 Тест поставлен в очередь\n"
+        f"Позиция в очереди: {position}\n"
+        f"Выполняется сейчас: {scheduler.running}"
     )
 
 @router.callback_query(F.data == "show_stats")
 async def show_statistics(callback: CallbackQuery, db: Database):
-    stats = db.get_user_statistics(callback.from_user.id)
+    stats = await db.get_user_statistics(callback.from_user.id)
     
     text = (
         f"📊 {hbold('Ваша статистика:')}\n\n"
@@ -180,7 +193,7 @@ async def process_subscription_purchase(callback: CallbackQuery, db: Database):
         return
     
     # Получаем реквизиты
-    requisites = db.get_requisites()
+    requisites = await db.get_requisites()
     if not requisites or not any(requisites):
         await callback.message.edit_text(
             "❌ Оплата временно недоступна. Обратитесь к администратору.",
@@ -224,7 +237,7 @@ async def confirm_payment(callback: CallbackQuery, state: FSMContext):
     await state.set_state(UserAuth.waiting_for_payment_screenshot)
 
 @router.message(UserAuth.waiting_for_payment_screenshot)
-async def process_payment_screenshot(message: Message, state: FSMContext, db: Database):
+async def process_payment_screenshot(message: Message, state: FSMContext, db: Database, config: Config):
     if not message.photo:
         await message.answer("Пожалуйста, отправьте скриншот чека в виде фотографии")
         return
@@ -233,7 +246,6 @@ async def process_payment_screenshot(message: Message, state: FSMContext, db: Da
     duration = data.get("subscription_duration")
     await state.clear()
     
-    config = load_config()
     admin_id = config.tg_bot.admin_ids[0]
     
     subscription_data = f"{message.from_user.id}_{duration}"  # Создаем строку с данными
@@ -1,12 +1,21 @@
 import asyncio
 import logging
+import signal
+from functools import partial
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import load_config
+from config import load_config, reload_config
 from handlers import router  # теперь импорт будет работать
 from database.sqlite import Database
+from database.fsm_storage import SQLiteStorage
 from middlewares.database import DatabaseMiddleware
+from middlewares.user_context import UserContextMiddleware
+from services.test_queue import TestRunScheduler, TestJob, QueueFullError, DuplicateJobError
+from services.progress import RateLimiter
+from services.metrics import start_metrics_server
+from services.webhook import WebhookServer
+from services.worker_pool import WorkerPool
+from utils.test_utils import run_test_job, notify_job_started, create_run_services, close_run_services
 
 logger = logging.getLogger(__name__)
 
@@ -17,19 +26,98 @@ async def main():
     )
     
     config = load_config()
-    storage = MemoryStorage()
+    database = Database(
+        config.db.database,
+        subscription_cache_size=config.db.subscription_cache_size,
+        subscription_negative_ttl=config.db.subscription_negative_ttl
+    )
+    await database.connect()
+    # Состояния FSM переживают перезапуск, в памяти только горячие записи
+    storage = SQLiteStorage(
+        database,
+        ttl=config.db.fsm_ttl,
+        flush_interval=config.db.fsm_flush_interval,
+        max_cached=config.db.fsm_cache_size
+    )
     bot = Bot(token=config.tg_bot.token)
     dp = Dispatcher(storage=storage)
+    # Конфигурация читается один раз и передается обработчикам через диспетчер
+    dp["config"] = config
+    
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, partial(reload_config, dp, "SIGHUP"))
     
-    database = Database(config.db.database)
     dp.message.middleware(DatabaseMiddleware(database))
     dp.callback_query.middleware(DatabaseMiddleware(database))
+    user_context_middleware = UserContextMiddleware(database)
+    dp.message.middleware(user_context_middleware)
+    dp.callback_query.middleware(user_context_middleware)
+    
+    # Прогоны выполняются либо в этом процессе, либо в процессах-воркерах,
+    # у каждого из которых свой Chromium
+    rate_limiter = RateLimiter()
+    worker_pool = None
+    run_services = None
+    if config.workers.processes:
+        worker_pool = WorkerPool(bot, config, processes=config.workers.processes, rate_limiter=rate_limiter)
+        await worker_pool.start()
+        runner = partial(run_test_job, bot=bot, db=database, worker_pool=worker_pool)
+    else:
+        run_services = await create_run_services(config, database)
+        runner = partial(run_test_job, bot=bot, db=database, rate_limiter=rate_limiter, **run_services)
+    
+    # Прогоны тестов выполняются воркерами очереди, а не в обработчике
+    scheduler = TestRunScheduler(
+        runner=runner,
+        workers=config.queue.workers,
+        max_queued=config.queue.max_queued,
+        max_per_user=config.queue.max_per_user,
+        on_start=partial(notify_job_started, bot=bot)
+    )
+    scheduler.start()
+    dp["scheduler"] = scheduler
+    
+    # Прогоны, прерванные перезапуском, продолжаются с последнего чекпоинта
+    for user_id, test_url in await database.get_unfinished_runs():
+        try:
+            await scheduler.submit(TestJob(user_id=user_id, test_url=test_url))
+            logger.info(f"🔄 Возобновлен прогон пользователя {user_id}")
+        except (QueueFullError, DuplicateJobError) as e:
+            logger.warning(f"⚠️ Не удалось возобновить прогон пользователя {user_id}: {e}")
+    
+    metrics_runner = None
+    if config.metrics.port:
+        metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.port)
     
     dp.include_router(router)
     
     logger.info("Starting bot")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        if config.webhook.url:
+            # Диспетчер и все зависимости общие, меняется только прием апдейтов
+            await WebhookServer(
+                dp, bot,
+                url=config.webhook.url,
+                path=config.webhook.path,
+                host=config.webhook.host,
+                port=config.webhook.port,
+                secret=config.webhook.secret,
+                max_concurrent=config.webhook.max_concurrent,
+                drain_timeout=config.webhook.drain_timeout
+            ).run()
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await scheduler.close()
+        if worker_pool:
+            await worker_pool.close()
+        if run_services:
+            await close_run_services(run_services)
+        await storage.close()
+        await database.close()
 
 if __name__ == "__main__":
     try:
@@ -1,3 +1,4 @@
 from .database import DatabaseMiddleware
+from .user_context import UserContextMiddleware, UserContext
 
-__all__ = ["DatabaseMiddleware"]
+__all__ = ["DatabaseMiddleware", "UserContextMiddleware", "UserContext"]
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+from config import Config
+from database.sqlite import Database
+
+@dataclass
+class UserContext:
+    user_id: int
+    has_credentials: bool
+    subscription: dict
+    is_admin: bool
+
+class UserContextMiddleware(BaseMiddleware):
+    """Передает обработчику UserContext, загруженный одним запросом.
+
+    Контекст загружается только для обработчиков с параметром
+    user_context и запоминается в данных апдейта, поэтому на один апдейт
+    приходится не больше одного запроса. Права администратора берутся из
+    config в данных диспетчера.
+    """
+
+    def __init__(self, database: Database):
+        super().__init__()
+        self.database = database
+
+    async def load(self, user_id: int, config: Config) -> UserContext:
+        row = await self.database.get_user_context(user_id)
+        return UserContext(
+            user_id=user_id,
+            has_credentials=row["has_credentials"],
+            subscription=row["subscription"],
+            is_admin=config.tg_bot.is_admin(user_id)
+        )
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        wanted = (
+            handler_object is None
+            or handler_object.varkw
+            or "user_context" in handler_object.params
+        )
+        if wanted and "user_context" not in data and event.from_user:
+            # Config берется из данных диспетчера, чтобы учитывать перезагрузку
+            data["user_context"] = await self.load(event.from_user.id, data["config"])
+        return await handler(event, data)
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+
+from typing import Awaitable, Callable
+
+from services.question_list import QuestionListItem
+from utils.answer_bank import normalize_question
+
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerPrefetcher:
+    """Параллельная предзагрузка ответов на весь список вопросов.
+
+    Поиск ответов запускается заранее с ограничением на число одновременных
+    запросов, а цикл прохождения теста забирает готовый результат по номеру
+    вопроса в списке. Сопоставлять по похожести текста нельзя: вопросы,
+    различающиеся одной дозой или сроком, получили бы чужой ответ.
+    Одинаковые тексты ищутся один раз.
+    """
+
+    def __init__(self, resolver: Callable[[str], Awaitable[str | None]],
+                 max_in_flight: int = 8):
+        self.resolver = resolver
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._by_key: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    async def _resolve(self, question_text: str) -> str | None:
+        async with self._semaphore:
+            try:
+                return await self.resolver(question_text)
+            except Exception as e:
+                logger.error(f"Ошибка предзагрузки ответа: {e}")
+                return None
+
+    def schedule(self, items: list[QuestionListItem]):
+        for item in items:
+            question_key = normalize_question(item.text)
+            if not question_key or item.index in self._tasks:
+                continue
+            task = self._by_key.get(question_key)
+            if task is None:
+                task = self._by_key[question_key] = asyncio.create_task(self._resolve(item.text))
+            self._tasks[item.index] = task
+
+    def missing(self, index: int) -> bool:
+        """True, если поиск по вопросу уже завершился и ответа нет."""
+        task = self._tasks.get(index)
+        return bool(task and task.done() and not task.cancelled() and task.result() is None)
+
+    async def get(self, index: int, question_text: str) -> str | None:
+        """Ответ из предзагрузки или прямой поиск, если вопроса в ней нет."""
+        task = self._tasks.get(index)
+        if task:
+            return await task
+        return await self._resolve(question_text)
+
+    def cancel(self):
+        for task in self._by_key.values():
+            task.cancel()
+        self._tasks.clear()
+        self._by_key.clear()
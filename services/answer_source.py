@@ -0,0 +1,82 @@
+import asyncio
+import re
+import logging
+
+from urllib import parse
+
+import aiohttp
+from lxml import html
+
+
+logger = logging.getLogger(__name__)
+
+ANSWERS_BASE_URL = "https://www.tests-exam.ru/"
+SEARCH_PATH = "search.html?kat=428&sea="
+ANSWERS_ENCODING = "cp1251"
+
+
+def build_search_url(question_text: str, base_url: str = ANSWERS_BASE_URL) -> str:
+    query = ' '.join(re.sub(r'[^\w\s]', '', question_text, flags=re.UNICODE).split()[:-2])
+    return base_url + SEARCH_PATH + parse.quote(query.encode(ANSWERS_ENCODING, errors='ignore'))
+
+
+class HttpAnswerSource:
+    """Поиск ответа на tests-exam.ru без браузера.
+
+    Повторяет цепочку search -> первый результат -> #prav_id через общий
+    keep-alive клиент aiohttp и lxml. Число одновременных запросов
+    ограничено семафором.
+    """
+
+    def __init__(self, max_concurrency: int = 8, timeout: float = 15,
+                 base_url: str = ANSWERS_BASE_URL):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._session: aiohttp.ClientSession = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def start(self):
+        if self._session:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.max_concurrency,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+        )
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def _fetch(self, url: str):
+        if not self._session:
+            await self.start()
+        async with self._semaphore:
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                body = await response.read()
+                encoding = response.charset or ANSWERS_ENCODING
+        return html.fromstring(body.decode(encoding, errors='replace'), base_url=str(url))
+
+    async def find_answer(self, question_text: str) -> str | None:
+        search_url = build_search_url(question_text, self.base_url)
+        tree = await self._fetch(search_url)
+
+        links = tree.xpath('//div[@class="b"]/a[@href]')
+        if not links:
+            logger.info(f"Ответ не найден в поиске: {search_url}")
+            return None
+
+        tree = await self._fetch(parse.urljoin(search_url, links[0].get('href')))
+        nodes = tree.xpath('//*[@id="prav_id"]')
+        if not nodes:
+            return None
+        return nodes[0].text_content().strip() or None
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import logging
+import subprocess
+
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
+
+
+logger = logging.getLogger(__name__)
+
+BROWSER_ARGS = ['--no-sandbox', '--disable-dev-shm-usage']
+CONTEXT_OPTIONS = {
+    "viewport": {'width': 1920, 'height': 1080},
+    "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+
+def ensure_playwright_browsers():
+    try:
+        if not os.path.exists(os.path.expanduser('~/.cache/ms-playwright')):
+            logger.info("🔄 Установка браузеров Playwright...")
+            subprocess.run(['playwright', 'install', 'chromium'], check=True)
+            logger.info("✅ Браузеры успешно установлены")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при установке браузеров: {e}")
+        raise
+
+
+class _PooledBrowser:
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.runs = 0
+        self.active = 0
+        self.retiring = False
+
+    @property
+    def healthy(self) -> bool:
+        return self.browser.is_connected() and not self.retiring
+
+
+class BrowserPool:
+    """Общий на процесс пул Chromium.
+
+    Браузеры запускаются один раз при старте бота, каждый прогон теста
+    получает собственный изолированный BrowserContext. Количество
+    одновременно выданных контекстов ограничено, браузер перезапускается
+    после recycle_after прогонов или при потере соединения.
+    """
+
+    def __init__(self, max_browsers: int = 1, max_contexts: int = 4, recycle_after: int = 50):
+        self.max_browsers = max(1, max_browsers)
+        self.max_contexts = max(1, max_contexts)
+        self.recycle_after = recycle_after
+        self._playwright: Playwright = None
+        self._browsers: list[_PooledBrowser] = []
+        self._leases: dict[BrowserContext, _PooledBrowser] = {}
+        self._semaphore = asyncio.Semaphore(self.max_contexts)
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    async def start(self):
+        ensure_playwright_browsers()
+        logger.info("🔄 Запуск пула браузеров...")
+        self._playwright = await async_playwright().start()
+        for _ in range(self.max_browsers):
+            self._browsers.append(await self._launch())
+        logger.info(f"✅ Пул браузеров запущен ({self.max_browsers} шт.)")
+
+    async def _launch(self) -> _PooledBrowser:
+        browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        return _PooledBrowser(browser)
+
+    async def _retire(self, slot: _PooledBrowser):
+        if slot in self._browsers:
+            self._browsers.remove(slot)
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии браузера: {e}")
+
+    async def _pick_browser(self) -> _PooledBrowser:
+        async with self._lock:
+            # Проверка состояния: отключившиеся браузеры закрываем сразу,
+            # отработавшие свой ресурс - когда на них не останется контекстов
+            for slot in list(self._browsers):
+                if not slot.browser.is_connected():
+                    logger.warning("⚠️ Браузер пула отключился, перезапускаем")
+                    await self._retire(slot)
+                elif slot.runs >= self.recycle_after:
+                    slot.retiring = True
+                    if slot.active == 0:
+                        logger.info("🔄 Плановый перезапуск браузера пула")
+                        await self._retire(slot)
+
+            healthy = [slot for slot in self._browsers if slot.healthy]
+            if len(healthy) < self.max_browsers and len(self._browsers) < self.max_browsers * 2:
+                slot = await self._launch()
+                self._browsers.append(slot)
+                healthy.append(slot)
+
+            candidates = healthy or [slot for slot in self._browsers if slot.browser.is_connected()]
+            return min(candidates, key=lambda slot: slot.active)
+
+    async def acquire(self, **context_options) -> BrowserContext:
+        if self._closed:
+            raise RuntimeError("Пул браузеров остановлен")
+
+        await self._semaphore.acquire()
+        try:
+            slot = await self._pick_browser()
+            context = await slot.browser.new_context(**{**CONTEXT_OPTIONS, **context_options})
+        except Exception:
+            self._semaphore.release()
+            raise
+
+        slot.runs += 1
+        slot.active += 1
+        self._leases[context] = slot
+        return context
+
+    async def release(self, context: BrowserContext):
+        slot = self._leases.pop(context, None)
+        if slot is None:
+            return
+
+        try:
+            await context.close()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии контекста: {e}")
+        finally:
+            slot.active -= 1
+            self._semaphore.release()
+
+        if slot.retiring and slot.active == 0:
+            async with self._lock:
+                await self._retire(slot)
+
+    @asynccontextmanager
+    async def lease(self, **context_options):
+        context = await self.acquire(**context_options)
+        try:
+            yield context
+        finally:
+            await self.release(context)
+
+    async def close(self):
+        self._closed = True
+        for context in list(self._leases):
+            await self.release(context)
+        for slot in list(self._browsers):
+            await self._retire(slot)
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        logger.info("✅ Пул браузеров остановлен")
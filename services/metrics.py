@@ -0,0 +1,177 @@
+import bisect
+import logging
+import time
+
+from contextlib import contextmanager
+
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+STAGE_METRIC = "test_run_stage_seconds"
+ERRORS_METRIC = "test_run_errors_total"
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: dict = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Счетчики и гистограммы задержек прогонов в памяти процесса."""
+
+    def __init__(self):
+        self.histograms: dict[tuple[str, tuple], Histogram] = {}
+        self.counters: dict[tuple[str, tuple], float] = {}
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+
+    def drain(self) -> tuple[dict, dict]:
+        """Забирает накопленные значения и обнуляет реестр.
+
+        Процессы-воркеры отдают так свои метрики процессу бота, который
+        складывает их через merge() и отдает в /metrics.
+        """
+        drained = (self.histograms, self.counters)
+        self.histograms, self.counters = {}, {}
+        return drained
+
+    def merge(self, histograms: dict, counters: dict):
+        for key, histogram in histograms.items():
+            own = self.histograms.get(key)
+            if own is None:
+                self.histograms[key] = histogram
+            else:
+                own.merge(histogram)
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(ERRORS_METRIC, stage=stage)
+            raise
+        finally:
+            self.observe(STAGE_METRIC, time.perf_counter() - started, stage=stage)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus."""
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bucket, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': bucket})} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def stage_summary(self) -> list[dict]:
+        summary = []
+        for (metric, labels), histogram in sorted(self.histograms.items()):
+            if metric != STAGE_METRIC:
+                continue
+            stage = dict(labels).get("stage")
+            summary.append({
+                "stage": stage,
+                "count": histogram.count,
+                "avg": histogram.sum / histogram.count if histogram.count else 0.0,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "errors": int(self.counters.get((ERRORS_METRIC, (("stage", stage),)), 0))
+            })
+        return summary
+
+
+metrics = MetricsRegistry()
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner | None:
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        # Занятый порт не должен мешать запуску бота
+        logger.error(f"❌ Не удалось запустить сервер метрик на {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    logger.info(f"✅ Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket для исходящих запросов к Telegram, общий для всех прогонов."""
+
+    def __init__(self, rate: float = 20, burst: int = 20):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ProgressReporter:
+    """Одно сообщение о ходе прогона, которое редактируется на месте.
+
+    update() только запоминает новое состояние и не ждет сети, отправкой
+    занимается фоновая задача не чаще одного раза в min_interval секунд.
+    """
+
+    def __init__(self, bot, chat_id: int, limiter: RateLimiter = None, min_interval: float = 3.0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.limiter = limiter
+        self.min_interval = min_interval
+        self.state = {"done": 0, "total": None, "answered": 0, "last": None}
+        self._message_id: int = None
+        self._sent_text: str = None
+        self._dirty = asyncio.Event()
+        self._task: asyncio.Task = None
+
+    def render(self) -> str:
+        total = self.state["total"] or "?"
+        text = (
+            f"🔄 Прохождение теста\n"
+            f"Вопрос: {self.state['done']}/{total}\n"
+            f"Найдено ответов: {self.state['answered']}"
+        )
+        if self.state["last"]:
+            text += f"\n\nПоследний ответ:\n{self.state['last']}"
+        return text
+
+    async def start(self):
+        if not (self.bot and self.chat_id) or self._task:
+            return
+        self._sent_text = self.render()
+        try:
+            message = await self._send(self.bot.send_message, self.chat_id, self._sent_text)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сообщения о прогрессе: {e}")
+            return
+        self._message_id = message.message_id
+        self._task = asyncio.create_task(self._loop())
+
+    def update(self, **fields):
+        self.state.update(fields)
+        self._dirty.set()
+
+    async def _send(self, method, *args, **kwargs):
+        if self.limiter:
+            await self.limiter.acquire()
+        return await method(*args, **kwargs)
+
+    async def _edit(self):
+        text = self.render()
+        if text == self._sent_text:
+            return
+        try:
+            await self._send(
+                self.bot.edit_message_text,
+                text=text,
+                chat_id=self.chat_id,
+                message_id=self._message_id
+            )
+            self._sent_text = text
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении прогресса: {e}")
+
+    async def _loop(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            await self._edit()
+            await asyncio.sleep(self.min_interval)
+
+    async def close(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Финальное состояние отправляем без ожидания интервала
+        await self._edit()
@@ -0,0 +1,45 @@
+from dataclasses import dataclass, field
+
+
+# Пункт списка вопросов, на который уже дан ответ на сайте
+ANSWERED_ITEM_SELECTOR = '.answered, .xforms-answered, [data-answered="true"]'
+
+
+@dataclass
+class QuestionListItem:
+    index: int
+    text: str
+    answered: bool = False
+
+    @property
+    def target(self) -> str:
+        """Селектор пункта списка, по которому открывается вопрос.
+
+        Пункт ищется по позиции: XForms перерисовывает список, и
+        проставленные на нем атрибуты не переживают перерисовку.
+        """
+        return f".xforms-repeat-item >> nth={self.index}"
+
+
+@dataclass
+class QuestionList:
+    """Модель экрана "К списку вопросов": число вопросов, их состояние и
+    селекторы для прямого перехода к каждому."""
+
+    items: list[QuestionListItem] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.items)
+
+    def pending(self, done=()) -> list[QuestionListItem]:
+        """Вопросы без ответа на сайте и без чекпоинта, по порядку.
+
+        Порядок по возрастанию самый дешевый: соседние вопросы проходятся
+        кнопкой "Далее", переход по списку нужен только через пропуски.
+        """
+        return [item for item in self.items if not item.answered and item.index not in done]
+
+    def with_text(self) -> list[QuestionListItem]:
+        # Короткие пункты - служебные подписи, а не текст вопроса
+        return [item for item in self.items if len(item.text.split()) > 3]
@@ -0,0 +1,185 @@
+import logging
+
+from collections import Counter
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Page, Route, Request, Response
+
+from services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Интерфейсу xsltforms/dijit нужны документ, скрипты, стили и XHR,
+# картинки, шрифты и медиа на ход теста не влияют
+DEFAULT_BLOCK_TYPES = ("image", "media", "font")
+DEFAULT_BLOCK_DOMAINS = (
+    "mc.yandex.ru", "yandex.ru/metrika", "google-analytics.com", "googletagmanager.com",
+    "doubleclick.net", "top-fwz1.mail.ru", "counter.yadro.ru", "vk.com", "facebook.net"
+)
+
+# Заблокированный ответ не скачивается, поэтому экономия оценивается по
+# типичному размеру ресурса данного типа
+ESTIMATED_SIZES = {
+    "image": 30_000,
+    "media": 200_000,
+    "font": 40_000,
+    "stylesheet": 20_000,
+    "script": 50_000
+}
+DEFAULT_ESTIMATED_SIZE = 10_000
+
+# Типы ресурсов блокируются через CDP по расширению в URL: маршруты
+# Playwright отключают HTTP-кэш контекста и гоняют каждый запрос через Python
+TYPE_EXTENSIONS = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "bmp"),
+    "media": ("mp4", "webm", "ogg", "mp3", "wav", "m4a"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+}
+BLOCKED_FAILURE = "ERR_BLOCKED_BY_CLIENT"
+
+
+def _host_matches(host: str, path: str, rules: tuple[str, ...]) -> bool:
+    for rule in rules:
+        domain, _, prefix = rule.partition("/")
+        if (host == domain or host.endswith("." + domain)) and path.startswith("/" + prefix):
+            return True
+    return False
+
+
+class ResourceStats:
+    """Счетчики одного прогона: что заблокировано и сколько загружено."""
+
+    def __init__(self):
+        self.blocked = Counter()
+        self.allowed = 0
+        self.saved_bytes = 0
+        self.loaded_bytes = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "blocked": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "allowed": self.allowed,
+            "saved_bytes": self.saved_bytes,
+            "loaded_bytes": self.loaded_bytes
+        }
+
+    def report(self):
+        """Пишет итоги прогона в лог и в счетчики метрик."""
+        for resource_type, count in self.blocked.items():
+            metrics.inc("blocked_requests_total", count, type=resource_type)
+        metrics.inc("blocked_bytes_estimated_total", self.saved_bytes)
+        metrics.inc("loaded_bytes_total", self.loaded_bytes)
+        logger.info(
+            f"🧹 Заблокировано запросов: {sum(self.blocked.values())} "
+            f"({dict(self.blocked)}), сэкономлено ~{self.saved_bytes // 1024} КБ, "
+            f"загружено {self.loaded_bytes // 1024} КБ"
+        )
+
+
+class ResourceFilter:
+    """Правила блокировки запросов для контекстов браузера.
+
+    Запрос блокируется, если его тип входит в block_types, домен - в
+    block_domains, или если задан allow_domains и домен в него не входит
+    (документы верхнего уровня пропускаются всегда). Правило домена
+    может содержать префикс пути: "yandex.ru/metrika".
+
+    Типы и домены блокируются списком шаблонов Network.setBlockedURLs на
+    каждой странице (attach_page), и HTTP-кэш контекста продолжает
+    работать: скрипты и стили xsltforms/dijit не скачиваются заново при
+    каждом переходе. allow_domains так не выразить, поэтому с ним
+    ставится маршрут Playwright, который кэш отключает.
+    """
+
+    def __init__(self, block_types=DEFAULT_BLOCK_TYPES, block_domains=DEFAULT_BLOCK_DOMAINS,
+                 allow_domains=(), enabled: bool = True):
+        self.block_types = frozenset(block_types)
+        self.block_domains = tuple(block_domains)
+        self.allow_domains = tuple(allow_domains)
+        self.enabled = enabled
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if resource_type == "document":
+            return False
+        if resource_type in self.block_types:
+            return True
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        host = (parts.hostname or "").lower()
+        if _host_matches(host, parts.path, self.block_domains):
+            return True
+        return bool(self.allow_domains) and not _host_matches(host, parts.path, self.allow_domains)
+
+    @property
+    def uses_route(self) -> bool:
+        return bool(self.allow_domains)
+
+    def blocked_url_patterns(self) -> list[str]:
+        patterns = []
+        for resource_type in sorted(self.block_types):
+            for extension in TYPE_EXTENSIONS.get(resource_type, ()):
+                patterns += [f"*.{extension}", f"*.{extension}?*"]
+        for rule in self.block_domains:
+            domain, _, prefix = rule.partition("/")
+            for host in (domain, "*." + domain):
+                patterns.append(f"*://{host}/{prefix}*")
+        return patterns
+
+    async def attach(self, context: BrowserContext) -> ResourceStats | None:
+        """Подключает фильтр к контексту и возвращает счетчики прогона.
+
+        Без allow_domains блокировку на страницах включает attach_page.
+        """
+        if not self.enabled:
+            return None
+        stats = ResourceStats()
+
+        def on_response(response: Response):
+            length = response.headers.get("content-length")
+            if length and length.isdigit():
+                stats.loaded_bytes += int(length)
+
+        def on_request_finished(request: Request):
+            stats.allowed += 1
+
+        context.on("response", on_response)
+        context.on("requestfinished", on_request_finished)
+
+        if not self.uses_route:
+            def on_request_failed(request: Request):
+                if BLOCKED_FAILURE in (request.failure or ""):
+                    resource_type = request.resource_type
+                    stats.blocked[resource_type] += 1
+                    stats.saved_bytes += ESTIMATED_SIZES.get(resource_type, DEFAULT_ESTIMATED_SIZE)
+
+            context.on("requestfailed", on_request_failed)
+            return stats
+
+        async def handle(route: Route, request: Request):
+            resource_type = request.resource_type
+            if self.should_block(request.url, resource_type):
+                stats.blocked[resource_type] += 1
+                stats.saved_bytes += ESTIMATED_SIZES.get(resource_type, DEFAULT_ESTIMATED_SIZE)
+                await route.abort("blockedbyclient")
+                return
+            await route.continue_()
+
+        await context.route("**/*", handle)
+        return stats
+
+    async def attach_page(self, page: Page):
+        """Включает блокировку по шаблонам URL на новой странице (Chromium)."""
+        if not self.enabled or self.uses_route:
+            return
+        patterns = self.blocked_url_patterns()
+        if not patterns:
+            return
+        try:
+            session = await page.context.new_cdp_session(page)
+            await session.send("Network.enable")
+            await session.send("Network.setBlockedURLs", {"urls": patterns})
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось включить блокировку ресурсов: {e}")
@@ -0,0 +1,68 @@
+import logging
+
+from database.sqlite import Database
+
+
+logger = logging.getLogger(__name__)
+
+
+class RunCheckpoints:
+    """Ход прогона по вопросам: индекс, выбранная буква и оценка совпадения.
+
+    Каждый пройденный вопрос сразу пишется в run_checkpoints, поэтому
+    после падения браузера или перезапуска бота прогон продолжается с
+    первого непройденного вопроса. Без db состояние хранится только в
+    памяти. Итог прогона считается по чекпоинтам. Буква ANSWERED_EARLIER
+    означает, что ответ был дан на сайте до этого прогона, и правильным
+    такой вопрос не считается.
+    """
+
+    ANSWERED_EARLIER = "?"
+
+    def __init__(self, db: Database = None, user_id: int = None, test_url: str = None):
+        self.db = db
+        self.user_id = user_id
+        self.test_url = test_url
+        self.questions: dict[int, tuple[str | None, int | None]] = {}
+
+    async def load(self) -> dict[int, tuple[str | None, int | None]]:
+        if self.db:
+            self.questions = await self.db.get_checkpoints(self.user_id, self.test_url)
+            if self.questions:
+                logger.info(f"🔄 Найден незавершенный прогон: пройдено {len(self.questions)} вопросов")
+        return self.questions
+
+    async def save(self, index: int, letter: str | None = None, match_score: int | None = None):
+        self.questions[index] = (letter, match_score)
+        if self.db:
+            await self.db.save_checkpoint(self.user_id, self.test_url, index, letter, match_score)
+
+    async def clear(self):
+        self.questions = {}
+        if self.db:
+            await self.db.delete_checkpoints(self.user_id, self.test_url)
+
+    @property
+    def answered(self) -> int:
+        """Вопросы, на которые ответ выбран прогоном (без ANSWERED_EARLIER)."""
+        return sum(
+            1 for letter, _ in self.questions.values()
+            if letter and letter != self.ANSWERED_EARLIER
+        )
+
+    @property
+    def answered_earlier(self) -> int:
+        return sum(1 for letter, _ in self.questions.values() if letter == self.ANSWERED_EARLIER)
+
+    def summary(self, total: int = None) -> dict:
+        # Ответы, данные на сайте до прогона, входят в total, но не в correct:
+        # их правильность неизвестна. total - число вопросов в тесте, если
+        # часть из них так и не удалось обработать
+        total = max(total or 0, len(self.questions))
+        correct = self.answered
+        return {
+            "correct": correct,
+            "total": total,
+            "answered_earlier": self.answered_earlier,
+            "percentage": round(correct / total * 100, 2) if total else 0.0
+        }
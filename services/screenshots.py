@@ -0,0 +1,125 @@
+import base64
+import logging
+
+from enum import IntEnum
+
+from aiogram.types import BufferedInputFile, InputMediaPhoto
+from playwright.async_api import Page
+
+from services.progress import RateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+# Telegram принимает не больше 10 фото в одном альбоме
+MAX_ALBUM_SIZE = 10
+
+
+class Verbosity(IntEnum):
+    NONE = 0
+    ERRORS = 1
+    MILESTONES = 2
+    ALL = 3
+
+
+class ScreenshotReporter:
+    """Скриншоты прогона в памяти без записи на диск.
+
+    Информационные кадры копятся и отправляются одним альбомом, кадры с
+    ошибками уходят сразу. Уровень verbosity определяет, какие кадры
+    вообще снимаются. При scale < 1 кадр уменьшается средствами Chromium
+    (CDP Page.captureScreenshot), формат по умолчанию - JPEG.
+    """
+
+    def __init__(self, bot=None, chat_id: int = None, verbosity: Verbosity = Verbosity.MILESTONES,
+                 image_format: str = "jpeg", quality: int = 70, scale: float = 1.0,
+                 limiter: RateLimiter = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.verbosity = Verbosity(verbosity)
+        self.image_format = image_format
+        self.quality = quality
+        self.scale = scale
+        self.limiter = limiter
+        self._pending: list[tuple[bytes, str]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bot and self.chat_id) and self.verbosity > Verbosity.NONE
+
+    async def _grab(self, page: Page) -> bytes:
+        options = {"type": self.image_format}
+        if self.image_format == "jpeg":
+            options["quality"] = self.quality
+        if self.scale >= 1:
+            return await page.screenshot(**options)
+
+        viewport = page.viewport_size or {"width": 1920, "height": 1080}
+        cdp = await page.context.new_cdp_session(page)
+        try:
+            params = {
+                "format": self.image_format,
+                "clip": {"x": 0, "y": 0, "scale": self.scale, **viewport}
+            }
+            if "quality" in options:
+                params["quality"] = self.quality
+            response = await cdp.send("Page.captureScreenshot", params)
+        finally:
+            await cdp.detach()
+        return base64.b64decode(response["data"])
+
+    def _input_file(self, data: bytes, number: int = 0) -> BufferedInputFile:
+        extension = "jpg" if self.image_format == "jpeg" else self.image_format
+        return BufferedInputFile(data, filename=f"step_{number}.{extension}")
+
+    async def capture(self, page: Page, caption: str, level: Verbosity = Verbosity.ALL):
+        if not self.enabled or self.verbosity < level:
+            return
+        try:
+            self._pending.append((await self._grab(page), f"ℹ️ {caption}"))
+        except Exception as e:
+            logger.error(f"Ошибка при создании скриншота: {e}")
+            return
+        if len(self._pending) >= MAX_ALBUM_SIZE:
+            await self.flush()
+
+    async def error(self, page: Page, message: str):
+        if not self.enabled:
+            return
+        await self.flush()
+        try:
+            data = await self._grab(page)
+            if self.limiter:
+                await self.limiter.acquire()
+            await self.bot.send_photo(
+                chat_id=self.chat_id,
+                photo=self._input_file(data),
+                caption=f"❌ {message}"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при отправке скриншота: {e}")
+
+    async def flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            if self.limiter:
+                await self.limiter.acquire()
+            if len(pending) == 1:
+                data, caption = pending[0]
+                await self.bot.send_photo(
+                    chat_id=self.chat_id,
+                    photo=self._input_file(data),
+                    caption=caption
+                )
+                return
+            await self.bot.send_media_group(
+                chat_id=self.chat_id,
+                media=[
+                    InputMediaPhoto(media=self._input_file(data, number), caption=caption)
+                    for number, (data, caption) in enumerate(pending)
+                ]
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при отправке скриншотов: {e}")
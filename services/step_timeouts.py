@@ -0,0 +1,73 @@
+import logging
+import math
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+from playwright.async_api import Page
+
+from services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class StepTimeouts:
+    """Таймауты шагов по наблюдаемым задержкам.
+
+    Для каждого именованного шага хранится скользящее окно длительностей
+    успешных выполнений. Таймаут шага - перцентиль окна, умноженный на
+    multiplier и ограниченный снизу floor_ms и сверху ceiling_ms. Пока
+    замеров меньше min_samples, действует ceiling_ms. Экземпляр общий на
+    процесс, поэтому каждый прогон учится на предыдущих.
+    """
+
+    def __init__(self, floor_ms: int = 2000, ceiling_ms: int = 15000, multiplier: float = 3.0,
+                 percentile: float = 0.95, window: int = 100, min_samples: int = 5):
+        self.floor_ms = floor_ms
+        self.ceiling_ms = max(floor_ms, ceiling_ms)
+        self.multiplier = multiplier
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque] = {}
+
+    def record(self, step: str, duration_ms: float):
+        samples = self._samples.get(step)
+        if samples is None:
+            samples = self._samples[step] = deque(maxlen=self.window)
+        samples.append(duration_ms)
+
+    def timeout_ms(self, step: str) -> int:
+        samples = self._samples.get(step)
+        if not samples or len(samples) < self.min_samples:
+            return self.ceiling_ms
+        ordered = sorted(samples)
+        observed = ordered[min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)]
+        return int(min(self.ceiling_ms, max(self.floor_ms, observed * self.multiplier)))
+
+    @contextmanager
+    def step(self, page: Page, name: str):
+        """Выполняет шаг с адаптивным таймаутом по умолчанию для page.
+
+        Заодно замеряет шаг в metrics (как metrics.span). После шага
+        таймаут страницы возвращается к ceiling_ms.
+        """
+        timeout = self.timeout_ms(name)
+        page.set_default_timeout(timeout)
+        started = time.perf_counter()
+        try:
+            with metrics.span(name):
+                yield
+        except Exception as e:
+            if "Timeout" in type(e).__name__:
+                logger.warning(f"⚠️ Шаг '{name}' не уложился в {timeout} мс")
+            raise
+        else:
+            self.record(name, (time.perf_counter() - started) * 1000)
+        finally:
+            page.set_default_timeout(self.ceiling_ms)
+
+    def stats(self) -> dict[str, int]:
+        return {step: self.timeout_ms(step) for step in sorted(self._samples)}
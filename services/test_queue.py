@@ -0,0 +1,160 @@
+import asyncio
+import itertools
+import logging
+
+from collections import deque, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Awaitable, Callable
+
+from services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+_job_ids = itertools.count(1)
+
+
+@dataclass
+class TestJob:
+    user_id: int
+    test_url: str
+    id: int = field(default_factory=lambda: next(_job_ids))
+    state: JobState = JobState.QUEUED
+    created_at: datetime = field(default_factory=datetime.now)
+    result: dict | None = None
+    error: str | None = None
+    # Уровень скриншотов для этого прогона (None - значение из конфига)
+    screenshot_verbosity: int | None = None
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class DuplicateJobError(Exception):
+    pass
+
+
+class TestRunScheduler:
+    """Очередь прогонов тестов с фиксированным числом воркеров.
+
+    Задачи хранятся в очередях по пользователям, воркеры забирают их по
+    кругу (round-robin), поэтому один пользователь не может занять все
+    слоты. Общий размер очереди и число задач на пользователя ограничены.
+    """
+
+    def __init__(self, runner: Callable[[TestJob], Awaitable[dict]], workers: int = 2,
+                 max_queued: int = 100, max_per_user: int = 1,
+                 on_start: Callable[[TestJob], Awaitable[None]] = None):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self.on_start = on_start
+        self._queues: OrderedDict[int, deque[TestJob]] = OrderedDict()
+        self._running: dict[int, TestJob] = {}
+        self._condition = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+        self._closed = False
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def start(self):
+        for number in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(number)))
+        logger.info(f"✅ Очередь тестов запущена ({self.workers} воркеров)")
+
+    def _user_jobs(self, user_id: int) -> int:
+        queued = len(self._queues.get(user_id, ()))
+        running = sum(1 for job in self._running.values() if job.user_id == user_id)
+        return queued + running
+
+    def position(self, job: TestJob) -> int:
+        """Позиция задачи в очереди с учетом кругового обхода (с 1)."""
+        if job.state != JobState.QUEUED:
+            return 0
+        queues = [list(queue) for queue in self._queues.values()]
+        position = 0
+        for depth in itertools.count():
+            layer = [queue[depth] for queue in queues if depth < len(queue)]
+            if not layer:
+                break
+            for queued_job in layer:
+                position += 1
+                if queued_job is job:
+                    return position
+        return 0
+
+    async def submit(self, job: TestJob) -> int:
+        if self._closed:
+            raise QueueFullError("Очередь остановлена")
+        async with self._condition:
+            if self._user_jobs(job.user_id) >= self.max_per_user:
+                raise DuplicateJobError("У пользователя уже есть тест в очереди")
+            if self.queued >= self.max_queued:
+                raise QueueFullError("Очередь переполнена")
+            self._queues.setdefault(job.user_id, deque()).append(job)
+            self._condition.notify()
+        return self.position(job)
+
+    async def _next_job(self) -> TestJob:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._queues)
+            # Берем первого пользователя и переносим его в конец круга
+            user_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            job.state = JobState.RUNNING
+            self._running[job.id] = job
+            return job
+
+    async def _worker(self, number: int):
+        while True:
+            job = await self._next_job()
+            logger.info(f"🔄 Воркер {number}: запуск задачи {job.id} пользователя {job.user_id}")
+            try:
+                if self.on_start:
+                    await self.on_start(job)
+                job.result = await self.runner(job)
+                if job.result and "error" in job.result:
+                    job.state = JobState.FAILED
+                    job.error = job.result["error"]
+                else:
+                    job.state = JobState.DONE
+            except asyncio.CancelledError:
+                job.state = JobState.FAILED
+                raise
+            except Exception as e:
+                logger.error(f"❌ Задача {job.id} завершилась ошибкой: {e}")
+                job.state = JobState.FAILED
+                job.error = str(e)
+            finally:
+                self._running.pop(job.id, None)
+                metrics.inc("test_runs_total", state=job.state.value)
+            logger.info(f"✅ Задача {job.id}: {job.state.value}")
+
+    async def close(self):
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
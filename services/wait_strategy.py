@@ -0,0 +1,75 @@
+import logging
+
+from playwright.async_api import Page, TimeoutError
+
+
+logger = logging.getLogger(__name__)
+
+
+class WaitStrategy:
+    """Ожидания по событиям DOM вместо фиксированных пауз.
+
+    Каждый шаг ждет то условие, которое ему действительно нужно: появление
+    селектора, навигацию или смену текста вопроса. networkidle и
+    фиксированная пауза используются только как запасной вариант
+    (settle) и по умолчанию отключены. Если timeout не передан явно,
+    действует таймаут страницы по умолчанию, его выставляет StepTimeouts.
+    """
+
+    def __init__(self, timeout_ms: int = 15000, fallback_networkidle: bool = False,
+                 fallback_sleep_ms: int = 0):
+        self.timeout_ms = timeout_ms
+        self.fallback_networkidle = fallback_networkidle
+        self.fallback_sleep_ms = fallback_sleep_ms
+
+    @property
+    def has_fallback(self) -> bool:
+        return self.fallback_networkidle or self.fallback_sleep_ms > 0
+
+    async def settle(self, page: Page):
+        if self.fallback_networkidle:
+            try:
+                await page.wait_for_load_state("networkidle", timeout=self.timeout_ms)
+            except TimeoutError:
+                logger.warning("⚠️ Не дождались networkidle")
+        if self.fallback_sleep_ms:
+            await page.wait_for_timeout(self.fallback_sleep_ms)
+
+    async def goto(self, page: Page, url: str):
+        await page.goto(url, wait_until="domcontentloaded")
+
+    async def for_selector(self, page: Page, selector: str, required: bool = True,
+                           timeout: int = None):
+        """Ждет селектор. Если required=False, по таймауту выполняется settle."""
+        try:
+            return await page.wait_for_selector(selector, timeout=timeout)
+        except TimeoutError:
+            if required:
+                raise
+            logger.warning(f"⚠️ Не дождались {selector}, используем запасное ожидание")
+            await self.settle(page)
+            return None
+
+    async def click_and_navigate(self, page: Page, selector: str):
+        async with page.expect_navigation(wait_until="domcontentloaded"):
+            await page.click(selector)
+
+    async def for_text_change(self, page: Page, xpath: str, previous: str):
+        """Ждет, пока текст узла по xpath станет отличным от previous.
+
+        По таймауту выполняется settle, только если запасное ожидание
+        настроено, иначе таймаут пробрасывается: со старым текстом на
+        странице вызывающий код обработал бы прежний вопрос.
+        """
+        try:
+            await page.wait_for_function('''([xpath, previous]) => {
+                const node = document.evaluate(
+                    xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+                ).singleNodeValue;
+                return node && node.innerText !== previous;
+            }''', arg=[xpath, previous])
+        except TimeoutError:
+            if not self.has_fallback:
+                raise
+            logger.warning("⚠️ Текст вопроса не изменился, используем запасное ожидание")
+            await self.settle(page)
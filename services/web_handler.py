@@ -1,102 +1,166 @@
 import asyncio
-import re
-import os
 import logging
-import subprocess
-
-from urllib import parse
+import time
 
 from fuzzywuzzy import process
 
-from aiogram.types import FSInputFile
+from playwright.async_api import async_playwright, TimeoutError, Page, Browser, BrowserContext, Locator
 
-from playwright.async_api import async_playwright, TimeoutError, Page, Browser, Locator
+from services.browser_pool import BrowserPool, BROWSER_ARGS, CONTEXT_OPTIONS, ensure_playwright_browsers
+from services.answer_source import HttpAnswerSource, build_search_url, ANSWERS_BASE_URL
+from services.answer_prefetch import AnswerPrefetcher
+from services.wait_strategy import WaitStrategy
+from services.screenshots import ScreenshotReporter, Verbosity
+from services.progress import ProgressReporter
+from services.resource_filter import ResourceFilter, ResourceStats
+from services.step_timeouts import StepTimeouts
+from services.run_checkpoints import RunCheckpoints
+from services.question_list import QuestionList, QuestionListItem, ANSWERED_ITEM_SELECTOR
+from services.metrics import metrics, STAGE_METRIC
+from utils.answer_bank import AnswerBank
 
 
 logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+PORTAL_URL = "https://fmza.ru"
+TESTING_URL = "http://selftest-mpe.mededtech.ru"
+QUESTION_XPATH = '//*[@id="xsltforms-subform-0-output-14_4_2_"]/span/span/p'
+OPTION_LETTERS = 'АБВГДЕЖЗИКЛМНОП'
+# Столько ошибок подряд означает, что страница сломана, а не отдельный вопрос
+MAX_CONSECUTIVE_FAILURES = 3
+
+
+class RunInterrupted(Exception):
+    """Прогон прерван: браузер или страница недоступны.
+
+    Итог не сохраняется, чекпоинты остаются, и повторный запуск
+    продолжает с первого непройденного вопроса.
+    """
+
 
 class WebHandler:
-    def __init__(self, bot_instance=None, user_id=None):
-        self.base_url = "http://selftest-mpe.mededtech.ru"
+    def __init__(self, bot_instance=None, user_id=None, browser_pool: BrowserPool = None,
+                 answer_bank: AnswerBank = None, answer_source: HttpAnswerSource = None,
+                 prefetch_concurrency: int = 8, wait_strategy: WaitStrategy = None,
+                 storage_state: dict = None, screenshots: ScreenshotReporter = None,
+                 progress: ProgressReporter = None, base_url: str = TESTING_URL,
+                 portal_url: str = PORTAL_URL, answers_url: str = ANSWERS_BASE_URL,
+                 resource_filter: ResourceFilter = None, step_timeouts: StepTimeouts = None,
+                 checkpoints: RunCheckpoints = None):
+        self.base_url = base_url
+        self.portal_url = portal_url
         self.bot = bot_instance
         self.user_id = user_id
+        self.browser_pool = browser_pool
         self.browser: Browser = None
-        self.context = None
-        self.answers_url = "https://www.tests-exam.ru/vopros.html?id_test=719&id_vopros=25565"
-        self.answer_page: Page = None
-        self._ensure_playwright_browsers()
-
-    def _ensure_playwright_browsers(self):
-        try:
-            if not os.path.exists(os.path.expanduser('~/.cache/ms-playwright')):
-                logger.info("🔄 Установка браузеров Playwright...")
-                subprocess.run(['playwright', 'install', 'chromium'], check=True)
-                logger.info("✅ Браузеры успешно установлены")
-        except Exception as e:
-            logger.error(f"❌ Ошибка при установке браузеров: {e}")
-            raise
+        self.context: BrowserContext = None
+        self._playwright = None
+        self.answers_url = answers_url
+        self.answer_bank = answer_bank
+        self.answer_source = answer_source
+        self.prefetch_concurrency = prefetch_concurrency
+        self.prefetcher: AnswerPrefetcher = None
+        self.waits = wait_strategy or WaitStrategy()
+        self.timeouts = step_timeouts or StepTimeouts(ceiling_ms=self.waits.timeout_ms)
+        # Сохраненная сессия пользователя и новая сессия после входа
+        self.storage_state = storage_state
+        self.fresh_storage_state: dict = None
+        self.screens = screenshots or ScreenshotReporter(bot_instance, user_id)
+        self.progress = progress or ProgressReporter(bot_instance, user_id)
+        self.resource_filter = resource_filter
+        self.checkpoints = checkpoints or RunCheckpoints()
+        self.resource_stats: ResourceStats = None
+        if not self.browser_pool:
+            ensure_playwright_browsers()
 
     async def _init_browser(self):
-        if not self.browser:
+        if self.context:
+            return
+
+        context_options = {}
+        if self.storage_state:
+            context_options["storage_state"] = self.storage_state
+
+        if self.browser_pool:
+            # Контекст выдается общим пулом, браузер уже запущен
+            self.context = await self.browser_pool.acquire(**context_options)
+            logger.info("✅ Получен контекст браузера из пула")
+        else:
             logger.info("🔄 Запуск браузера...")
-            p = await async_playwright().start()
-            self.browser = await p.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-dev-shm-usage']
-            )
-            self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            )
+            self._playwright = await async_playwright().start()
+            self.browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+            self.context = await self.browser.new_context(**{**CONTEXT_OPTIONS, **context_options})
             logger.info("✅ Браузер запущен успешно")
 
+        # Вне шагов действует потолок таймаутов, внутри шага - адаптивный
+        self.context.set_default_timeout(self.timeouts.ceiling_ms)
+        if self.resource_filter:
+            self.resource_stats = await self.resource_filter.attach(self.context)
+
+    async def _new_page(self) -> Page:
+        page = await self.context.new_page()
+        if self.resource_filter:
+            await self.resource_filter.attach_page(page)
+        return page
+
     async def close(self):
-        if self.context:
-            await self.context.close()
+        await self.screens.flush()
+        await self.progress.close()
+        if self.prefetcher:
+            self.prefetcher.cancel()
+            self.prefetcher = None
+        if self.resource_stats:
+            self.resource_stats.report()
+            self.resource_stats = None
+        context, self.context = self.context, None
+        if self.browser_pool:
+            if context:
+                await self.browser_pool.release(context)
+            return
+
+        if context:
+            await context.close()
         if self.browser:
             await self.browser.close()
+            self.browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
 
-    async def _send_error_screenshot(self, screenshot_path: str, error_message: str):
-        if self.bot and self.user_id:
-            try:
-                photo = FSInputFile(screenshot_path)
-                await self.bot.send_photo(
-                    chat_id=self.user_id,
-                    photo=photo,
-                    caption=f"❌ {error_message}"
-                )
-                os.remove(screenshot_path)  # Удаляем файл после отправки
-            except Exception as e:
-                logger.error(f"Ошибка при отправке скриншота: {e}")
+    async def _probe_session(self, page: Page) -> bool:
+        # Дешевая проверка: если вместо формы входа открылся кабинет,
+        # сохраненная сессия еще жива
+        try:
+            await self.waits.goto(page, self.base_url)
+            await page.wait_for_selector('input[name="j_username"], #dijit_form_Button_0_label')
+            return await page.locator('input[name="j_username"]').count() == 0
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось проверить сохраненную сессию: {e}")
+            return False
 
-    async def _send_info_screenshot(self, screenshot_path: str, message: str):
-        if self.bot and self.user_id:
-            try:
-                photo = FSInputFile(screenshot_path)
-                await self.bot.send_photo(
-                    chat_id=self.user_id,
-                    photo=photo,
-                    caption=f"ℹ️ {message}"
-                )
-                os.remove(screenshot_path)
-            except Exception as e:
-                logger.error(f"Ошибка при отправке скриншота: {e}")
-    
     async def login(self, login: str, password: str):
         logger.info("🔄 Начинаем процесс авторизации...")
         
         try:
-            await self._init_browser()
-            page = await self.context.new_page()
-            page.set_default_timeout(60000)
+            with metrics.span("init_browser"):
+                await self._init_browser()
+            page = await self._new_page()
+            
+            if self.storage_state:
+                with self.timeouts.step(page, "login: проверка сессии"):
+                    session_alive = await self._probe_session(page)
+                if session_alive:
+                    logger.info("✅ Сохраненная сессия активна, вход пропущен")
+                    return page
+                logger.info("🔄 Сохраненная сессия истекла, выполняем вход заново")
+                self.storage_state = None
             
             # Первая часть навигации по fmza.ru
             steps = [
                 ("Переход на сайт fmza.ru", 
-                 lambda: page.goto("https://fmza.ru", wait_until="networkidle")),
+                 lambda: self.waits.goto(page, self.portal_url)),
                 
                 ("Поиск 'Первичная аккредитация'", 
                  lambda: page.wait_for_selector('a:has-text("Первичная аккредитация (СПО)")')),
@@ -113,64 +177,47 @@ class WebHandler:
             for step_name, step_action in steps:
                 try:
                     logger.info(f"🔄 {step_name}...")
-                    await step_action()
-                    await page.wait_for_load_state("networkidle")
+                    with self.timeouts.step(page, f"login: {step_name}"):
+                        await step_action()
+                        await self.waits.settle(page)
                     
-                    # Делаем и отправляем скриншот каждого шага
-                    screenshot_path = f"step_{step_name.lower().replace(' ', '_')}.png"
-                    await page.screenshot(path=screenshot_path)
-                    await self._send_info_screenshot(
-                        screenshot_path,
-                        f"Шаг: {step_name} - успешно"
-                    )
+                    # Скриншот каждого шага (только на подробном уровне)
+                    await self.screens.capture(page, f"Шаг: {step_name} - успешно")
                     
                     logger.info(f"✅ {step_name} - успешно")
                 except Exception as e:
-                    error_path = f"error_{step_name.lower().replace(' ', '_')}.png"
-                    await page.screenshot(path=error_path)
-                    await self._send_error_screenshot(
-                        error_path,
-                        f"Ошибка на шаге '{step_name}': {str(e)}"
-                    )
+                    await self.screens.error(page, f"Ошибка на шаге '{step_name}': {str(e)}")
                     raise
 
             # Переход на новый сайт и авторизация
             try:
                 logger.info("🔄 Переход на сайт тестирования...")
-                await page.goto(self.base_url, wait_until="networkidle")
+                with self.timeouts.step(page, "login: переход на сайт тестирования"):
+                    await self.waits.goto(page, self.base_url)
                 logger.info("✅ Переход выполнен успешно")
 
                 logger.info("🔄 Ожидание формы авторизации...")
-                await page.wait_for_selector('input[name="j_username"]')
+                with self.timeouts.step(page, "login: ожидание формы"):
+                    await page.wait_for_selector('input[name="j_username"]')
                 logger.info("🔄 Заполнение формы авторизации...")
                 
                 await page.fill('input[name="j_username"]', login)
                 await page.fill('input[name="j_password"]', password)
                 
-                await page.screenshot(path="before_login.png")
-                await self._send_info_screenshot(
-                    "before_login.png",
-                    "Форма авторизации заполнена, выполняем вход..."
-                )
+                await self.screens.capture(page, "Форма авторизации заполнена, выполняем вход...")
                 
-                await page.click('input.login-button[type="submit"]')
-                await page.wait_for_load_state("networkidle")
+                with self.timeouts.step(page, "login: вход"):
+                    await self.waits.click_and_navigate(page, 'input.login-button[type="submit"]')
+                    await self.waits.settle(page)
+                self.fresh_storage_state = await self.context.storage_state()
                 
-                await page.screenshot(path="after_login.png")
-                await self._send_info_screenshot(
-                    "after_login.png",
-                    "✅ Авторизация выполнена"
-                )
+                await self.screens.capture(page, "✅ Авторизация выполнена", Verbosity.MILESTONES)
+                await self.screens.flush()
                 
                 return page
 
             except Exception as e:
-                error_path = "error_auth.png"
-                await page.screenshot(path=error_path)
-                await self._send_error_screenshot(
-                    error_path,
-                    f"Ошибка при авторизации: {str(e)}"
-                )
+                await self.screens.error(page, f"Ошибка при авторизации: {str(e)}")
                 raise
                 
         except Exception as e:
@@ -179,109 +226,141 @@ class WebHandler:
             raise
 
     async def start_test(self, page):
+        with metrics.span("start_test"):
+            return await self._start_test(page)
+
+    async def _start_test(self, page):
         try:
             logger.info("🔄 Начинаем создание теста...")
-            await page.wait_for_load_state("networkidle")
             
             # Шаг 1: Нажатие кнопки "Пройти тестирование"
             logger.info("🔄 Ищем кнопку 'Пройти тестирование'...")
-            await page.wait_for_timeout(2000)  # Даем странице полностью загрузиться
-            await page.screenshot(path="before_start_button.png")
-            await self._send_info_screenshot(
-                "before_start_button.png",
-                "Ищем кнопку 'Пройти тестирование'"
-            )
-            
-            await page.click('#dijit_form_Button_0_label')
-            await page.wait_for_load_state("networkidle")
+            with self.timeouts.step(page, "start_test: Пройти тестирование"):
+                await self.waits.for_selector(page, '#dijit_form_Button_0_label')
+                await self.screens.capture(page, "Ищем кнопку 'Пройти тестирование'")
+                
+                await page.click('#dijit_form_Button_0_label')
+                await self.waits.settle(page)
             logger.info("✅ Кнопка 'Пройти тестирование' нажата")
             
             # Шаг 2: Выбор специальности
             logger.info("🔄 Выбираем специальность...")
-            await page.wait_for_timeout(2000)
-            await page.screenshot(path="specialty_selection.png")
-            await self._send_info_screenshot(
-                "specialty_selection.png",
-                "Выбираем 'Фармация, 2025'"
-            )
-            
-            await page.click('span.extraSpace:has-text("Фармация, 2025")')
-            await page.wait_for_load_state("networkidle")
+            with self.timeouts.step(page, "start_test: выбор специальности"):
+                await self.waits.for_selector(page, 'span.extraSpace:has-text("Фармация, 2025")')
+                await self.screens.capture(page, "Выбираем 'Фармация, 2025'")
+                
+                await page.click('span.extraSpace:has-text("Фармация, 2025")')
+                await self.waits.settle(page)
             logger.info("✅ Специальность выбрана")
             
             # Шаг 3: Переход к первому вопросу
             logger.info("🔄 Переходим к первому вопросу...")
-            await page.wait_for_timeout(2000)
-            await page.screenshot(path="before_first_question.png")
-            await self._send_info_screenshot(
-                "before_first_question.png",
-                "Переходим к тестированию"
-            )
-            
-            await page.click('#xsltforms-subform-0-label-2_2_6_4_2_')
-            await page.wait_for_load_state("networkidle")
+            with self.timeouts.step(page, "start_test: переход к первому вопросу"):
+                await self.waits.for_selector(page, '#xsltforms-subform-0-label-2_2_6_4_2_')
+                await self.screens.capture(page, "Переходим к тестированию")
+                
+                await page.click('#xsltforms-subform-0-label-2_2_6_4_2_')
+                await self.waits.for_selector(page, QUESTION_XPATH, required=False)
             logger.info("✅ Тест начат")
             
             return page
             
         except Exception as e:
-            error_path = "error_start_test.png"
-            await page.screenshot(path=error_path)
-            await self._send_error_screenshot(
-                error_path,
-                f"❌ Ошибка при подготовке теста: {str(e)}"
-            )
+            await self.screens.error(page, f"❌ Ошибка при подготовке теста: {str(e)}")
             raise
     
     async def parse_answer(self, question_text: str):
-        if not self.answer_page:
-            self.answer_page = await self.browser.new_page()
-        
-        url = (
-                "https://www.tests-exam.ru/search.html?kat=428&sea="
-                + parse.quote(
-                    (' '.join(re.sub(r'[^\w\s]', '', question_text, flags=re.UNICODE).split()[:-2])).encode('cp1251')
-                )
-            )
-        print(url)
-        await self.answer_page.goto(url)
-        # переход на страницу с ответом
-        await self.answer_page.click('//div[@class="b"]/a[@href]')
-        
-        return (await self.answer_page.locator('//*[@id="prav_id"]').text_content()).strip()
+        # Сначала ищем в локальном банке ответов, в сеть идем только при промахе
+        if self.answer_bank:
+            answer = await self.answer_bank.get(question_text)
+            if answer:
+                return answer
+
+        answer = await self._fetch_remote_answer(question_text)
+        if self.answer_bank:
+            await self.answer_bank.put(question_text, answer)
+        return answer
+
+    async def _fetch_remote_answer(self, question_text: str):
+        if self.answer_source:
+            try:
+                return await self.answer_source.find_answer(question_text)
+            except Exception as e:
+                logger.warning(f"⚠️ HTTP-поиск ответа не удался, используем браузер: {e}")
+
+        return await self._fetch_answer_with_browser(question_text)
+
+    async def _fetch_answer_with_browser(self, question_text: str):
+        # Своя страница на каждый поиск: при предзагрузке запасной путь
+        # вызывается параллельно, и общая страница перепутала бы ответы
+        answer_page = await self._new_page()
+        try:
+            url = build_search_url(question_text, self.answers_url)
+            logger.info(url)
+            await answer_page.goto(url)
+            # переход на страницу с ответом
+            await answer_page.click('//div[@class="b"]/a[@href]')
+            
+            return (await answer_page.locator('//*[@id="prav_id"]').text_content()).strip()
+        finally:
+            await answer_page.close()
     
-    async def get_answer(self, page: Page, question_text: str) -> tuple[str, str] | None:
+    async def _extract_question(self, page: Page) -> dict | None:
+        # Текст вопроса и все варианты ответа за один вызов evaluate.
+        # Радиокнопки помечаются атрибутом data-mt-option, чтобы потом
+        # кликнуть по нужной без повторного поиска по тексту буквы
+        return await page.evaluate('''([questionXpath, alphabet]) => {
+            const questionNode = document.evaluate(
+                questionXpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+            ).singleNodeValue;
+            if (!questionNode) return null;
+
+            const rows = document.querySelectorAll('table.question_options > tbody > tr');
+            const options = [];
+            rows.forEach((row, index) => {
+                const cells = Array.from(row.cells);
+                const textCell = cells[2] || cells[cells.length - 1];
+                if (!textCell) return;
+                const letterCell = cells.find(cell => /^[A-ZА-ЯЁ][.)]?$/.test(cell.innerText.trim()));
+                const letter = letterCell
+                    ? letterCell.innerText.trim().replace(/[.)]$/, '')
+                    : (alphabet[index] || String(index + 1));
+                const radio = row.querySelector('td.dijitReset')
+                    || row.querySelector('input[type="radio"]')
+                    || letterCell;
+                if (radio) radio.setAttribute('data-mt-option', String(index));
+                options.push({index, letter, text: textCell.innerText});
+            });
+            return {question: questionNode.innerText, options};
+        }''', [QUESTION_XPATH, OPTION_LETTERS])
+
+    async def get_answer(self, question: dict, index: int = None) -> tuple[dict, str, int] | None:
         try:
             logger.info("🔄 Получаем варианты ответов...")
             
-            # Находим все варианты ответов с их буквами
+            # Варианты ответов уже извлечены вместе с вопросом
             options = {}
-            letters = ['А', 'Б', 'В', 'Г']  # Буквы вариантов ответов
-            
-            for i, letter in enumerate(letters, 1):
-                try:
-                    # Получаем текст варианта ответа
-                    option_text = await page.locator(f"table.question_options > tbody > tr:nth-child({i}) td:nth-child(3)").inner_text()
-                    if option_text:
-                        clean_text = option_text.split("Обоснование")[0].strip()
-                        options[clean_text] = letter
-                except Exception as e:
-                    logger.error(f"Ошибка при получении варианта {letter}: {e}")
-                    continue
+            for option in question["options"]:
+                clean_text = option["text"].split("Обоснование")[0].strip()
+                if clean_text:
+                    options[clean_text] = option
+            question_text = question["question"]
 
-            # Получаем правильный ответ
-            correct_answer = await self.parse_answer(question_text)
+            # Получаем правильный ответ (из предзагрузки, если она запущена)
+            with metrics.span("question: parse_answer"):
+                if self.prefetcher:
+                    correct_answer = await self.prefetcher.get(index, question_text)
+                else:
+                    correct_answer = await self.parse_answer(question_text)
             if correct_answer:
                 clean_correct = correct_answer.split("Обоснование")[0].strip()
-                closest_match = process.extractOne(clean_correct, options.keys())
+                with metrics.span("question: fuzzy_match"):
+                    closest_match = process.extractOne(clean_correct, options.keys())
                 
                 if closest_match and closest_match[1] >= 85:
-                    letter = options[closest_match[0]]
-                    await self.bot.send_message(
-                        self.user_id,
-                        f"Правильный ответ:\n{closest_match[0]} ({letter})"
-                    )
-                    return letter, closest_match[0]
+                    option = options[closest_match[0]]
+                    self.progress.update(last=f"{closest_match[0]} ({option['letter']})")
+                    return option, closest_match[0], closest_match[1]
             
             return None
 
@@ -289,18 +368,53 @@ class WebHandler:
             logger.error(f"❌ Ошибка при поиске ответа: {e}")
             return None
 
+    async def _read_question_list(self, page: Page) -> QuestionList:
+        # Список разбирается за один вызов evaluate, к вопросу потом
+        # переходим по позиции пункта
+        try:
+            items = await page.evaluate('''(answeredSelector) => {
+                const items = Array.from(document.querySelectorAll('.xforms-repeat-item'));
+                return items.map((item, index) => {
+                    return {
+                        index,
+                        text: (item.innerText || '').replace(/^\\s*\\d+[.)]?\\s*/, '').trim(),
+                        answered: item.matches(answeredSelector)
+                            || item.querySelector(answeredSelector) !== null
+                    };
+                });
+            }''', ANSWERED_ITEM_SELECTOR)
+            return QuestionList([QuestionListItem(**item) for item in items])
+        except Exception as e:
+            logger.error(f"Ошибка при чтении списка вопросов: {e}")
+            return QuestionList()
+
+    async def _open_question(self, page: Page, item: QuestionListItem):
+        # Переход к вопросу по пункту списка вопросов
+        previous = await page.evaluate('''(xpath) => {
+            const node = document.evaluate(
+                xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+            ).singleNodeValue;
+            return node ? node.innerText : null;
+        }''', QUESTION_XPATH)
+        await page.click(item.target)
+        if previous is None:
+            await self.waits.for_selector(page, QUESTION_XPATH)
+        else:
+            await self.waits.for_text_change(page, QUESTION_XPATH, previous)
+
+    @staticmethod
+    def _page_lost(page: Page, error: Exception) -> bool:
+        # Закрытая страница или упавший браузер: дальше все вопросы упадут так же
+        message = str(error)
+        return page.is_closed() or "has been closed" in message or "crashed" in message
+
     async def process_test(self, page, test_url: str):
         try:
             logger.info("🔄 Переходим по ссылке на тест...")
-            await page.goto(test_url)
-            await page.wait_for_load_state("networkidle")
-            await page.wait_for_timeout(2000)  # Даем странице полностью загрузиться
+            await self.waits.goto(page, test_url)
+            await self.waits.settle(page)
             
-            await page.screenshot(path="before_list.png")
-            await self._send_info_screenshot(
-                "before_list.png",
-                "Переходим к списку вопросов..."
-            )
+            await self.screens.capture(page, "Переходим к списку вопросов...")
             
             # Нажимаем кнопку "К списку вопросов" с новым селектором
             try:
@@ -327,59 +441,128 @@ class WebHandler:
                     logger.error(f"❌ Альтернативный метод также не сработал: {e2}")
                     raise
             
-            await page.wait_for_load_state("networkidle")
-            await page.wait_for_timeout(2000)
+            await self.waits.for_selector(page, '.xforms-repeat-item', required=False)
             
-            await page.screenshot(path="questions_list.png")
-            await self._send_info_screenshot(
-                "questions_list.png",
-                "Список вопросов открыт"
-            )
+            await self.screens.capture(page, "Список вопросов открыт", Verbosity.MILESTONES)
+            await self.screens.flush()
+            
+            question_list = await self._read_question_list(page)
+            # Прямой переход возможен только по прочитанному списку, иначе
+            # проходим 80 вопросов подряд кнопкой "Далее", как раньше
+            direct = question_list.count > 0
+            if not direct:
+                logger.warning("⚠️ Список вопросов пуст, проходим 80 вопросов подряд")
+                question_list = QuestionList([QuestionListItem(index, "") for index in range(80)])
+            else:
+                logger.info(f"✅ В тесте {question_list.count} вопросов")
+            
+            await self.checkpoints.load()
+            if not direct and self.checkpoints.questions:
+                # Без списка к вопросу не перейти, а "Далее" ведет с первого:
+                # чекпоинты прошлого прогона здесь не помогут
+                logger.warning("⚠️ Без списка вопросов продолжить прогон нельзя, начинаем заново")
+                await self.checkpoints.clear()
+            # Ответы, данные на сайте до этого прогона, тоже идут в итог
+            for item in question_list.items:
+                if item.answered and item.index not in self.checkpoints.questions:
+                    await self.checkpoints.save(item.index, RunCheckpoints.ANSWERED_EARLIER)
+            pending = question_list.pending(self.checkpoints.questions)
             
-            # Остальная логика обработки теста
-            correct_answers = 0
-            current_question = 80
+            # Запускаем параллельный поиск ответов только на оставшиеся вопросы
+            if self.prefetch_concurrency > 0:
+                questions = QuestionList(pending).with_text()
+                if questions:
+                    self.prefetcher = AnswerPrefetcher(self.parse_answer, self.prefetch_concurrency)
+                    self.prefetcher.schedule(questions)
+                    logger.info(f"🔄 Запущена предзагрузка ответов: {len(self.prefetcher)} вопросов")
+            
+            await self.progress.start()
+            self.progress.update(
+                total=question_list.count,
+                done=len(self.checkpoints.questions),
+                answered=self.checkpoints.answered
+            )
+            if pending and len(pending) < question_list.count:
+                logger.info(f"🔄 Осталось {len(pending)} вопросов, начинаем с {pending[0].index + 1}")
+            # Индекс вопроса, открытого на странице (None - неизвестно)
+            on_page = 0
+            failures = 0
 
-            while current_question > 0:
-                logger.info(f"🔄 Обработка вопроса {current_question}")
+            for position, item in enumerate(pending):
+                index = item.index
+                next_index = pending[position + 1].index if position + 1 < len(pending) else None
+                # Ответ уже не найден при предзагрузке - открывать вопрос незачем
+                if self.prefetcher and self.prefetcher.missing(index):
+                    logger.info(f"⚠️ Ответ на вопрос {index + 1} не найден, пропускаем")
+                    await self.checkpoints.save(index)
+                    self.progress.update(done=len(self.checkpoints.questions))
+                    continue
+                logger.info(f"🔄 Обработка вопроса {index + 1}")
+                question_started = time.perf_counter()
                 
                 try:
-                    question_element = await page.wait_for_selector('//*[@id="xsltforms-subform-0-output-14_4_2_"]/span/span/p')
-                    question_text = await question_element.inner_text()
+                    if direct and on_page != index:
+                        with self.timeouts.step(page, "question: переход к вопросу"):
+                            await self._open_question(page, item)
+                        on_page = index
+                    
+                    with self.timeouts.step(page, "question: extract"):
+                        await self.waits.for_selector(page, QUESTION_XPATH)
+                        question = await self._extract_question(page)
                     
                     # Получаем букву правильного ответа
-                    result = await self.get_answer(page, question_text)
+                    result = await self.get_answer(question, index) if question else None
                     
+                    letter, match_score = None, None
                     if result:
-                        letter, answer_text = result
-                        # Находим и кликаем по нужному radiobox
-                        radio_selector = f"td.dijitReset:has-text('{letter}')"
-                        await page.click(radio_selector)
-                        correct_answers += 1
+                        option, answer_text, match_score = result
+                        # Кликаем по помеченному radiobox
+                        with self.timeouts.step(page, "question: click"):
+                            await page.click(f'[data-mt-option="{option["index"]}"]')
+                        letter = option["letter"]
                         
                         logger.info(f"✅ Выбран ответ {letter}: {answer_text}")
+                    await self.checkpoints.save(index, letter, match_score)
                     
-                    # Переходим к следующему вопросу
-                    await page.click("text=Далее")
-                    await page.wait_for_load_state("networkidle")
-                    current_question -= 1
+                    # "Далее" нужен, только если следующий в очереди вопрос
+                    # соседний, к остальным переходим по списку
+                    if direct and next_index != index + 1:
+                        on_page = index
+                    else:
+                        with self.timeouts.step(page, "question: далее"):
+                            await page.click("text=Далее")
+                            if question:
+                                await self.waits.for_text_change(page, QUESTION_XPATH, question["question"])
+                            else:
+                                await self.waits.settle(page)
+                        on_page = index + 1
+                    metrics.observe(STAGE_METRIC, time.perf_counter() - question_started, stage="question: total")
+                    failures = 0
                     
                 except Exception as e:
-                    logger.error(f"Ошибка при обработке вопроса {current_question}: {e}")
-                    current_question -= 1
-                    continue
+                    logger.error(f"Ошибка при обработке вопроса {index + 1}: {e}")
+                    # Чекпоинт не пишем: вопрос остается непройденным
+                    on_page = None if direct else index + 1
+                    failures += 1
+                    if self._page_lost(page, e):
+                        raise RunInterrupted(
+                            f"браузер закрылся на вопросе {index + 1}, "
+                            "повторный запуск продолжит с этого места"
+                        ) from e
+                    if failures >= MAX_CONSECUTIVE_FAILURES:
+                        raise RunInterrupted(
+                            f"{failures} вопроса подряд не удалось обработать, "
+                            "повторный запуск продолжит с первого непройденного"
+                        ) from e
+                finally:
+                    self.progress.update(
+                        done=len(self.checkpoints.questions),
+                        answered=self.checkpoints.answered
+                    )
 
-            return {
-                "correct": correct_answers,
-                "total": 80 - current_question,
-                "percentage": round((correct_answers / (80 - current_question)) * 100, 2)
-            }
+            # Необработанные вопросы входят в итог как неотвеченные
+            return self.checkpoints.summary(total=question_list.count)
 
         except Exception as e:
-            error_path = "error_processing_test.png"
-            await page.screenshot(path=error_path)
-            await self._send_error_screenshot(
-                error_path,
-                f"❌ Ошибка при выполнении теста: {str(e)}"
-            )
+            await self.screens.error(page, f"❌ Ошибка при выполнении теста: {str(e)}")
             raise
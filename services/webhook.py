@@ -0,0 +1,132 @@
+import asyncio
+import hmac
+import logging
+import secrets
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Прием апдейтов через вебхук на локальном сервере aiohttp.
+
+    Запрос проверяется по секретному токену (без WEBHOOK_SECRET он
+    генерируется при запуске) и сразу получает ответ 200, а апдейт
+    обрабатывается фоновой задачей. Число одновременно
+    обрабатываемых апдейтов ограничено max_concurrent: когда лимит занят,
+    ответ Telegram задерживается, и он сам снижает темп. При остановке
+    сервер перестает принимать запросы и ждет уже принятые апдейты не
+    дольше drain_timeout секунд.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, url: str, path: str = "/webhook",
+                 host: str = "0.0.0.0", port: int = 8080, secret: str = None,
+                 max_concurrent: int = 50, drain_timeout: float = 30):
+        self.dp = dp
+        self.bot = bot
+        self.url = url.rstrip("/") + path
+        self.path = path
+        self.host = host
+        self.port = port
+        if not secret:
+            # Без секрета поддельный апдейт мог бы прислать любой, кто видит порт.
+            # Случайный секрет годится для одного экземпляра: каждый запуск
+            # заново регистрирует вебхук с новым значением
+            secret = secrets.token_urlsafe(32)
+            logger.warning("⚠️ WEBHOOK_SECRET не задан, используется случайный секрет "
+                           "(для нескольких экземпляров задайте общий)")
+        self.secret = secret
+        self.max_concurrent = max_concurrent
+        self.drain_timeout = drain_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks: set[asyncio.Task] = set()
+        self._runner: web.AppRunner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret
+        ):
+            metrics.inc("webhook_updates_total", result="unauthorized")
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"⚠️ Некорректный апдейт: {e}")
+            metrics.inc("webhook_updates_total", result="invalid")
+            return web.Response(status=400)
+
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        metrics.inc("webhook_updates_total", result="accepted")
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке апдейта {update.update_id}: {e}")
+        finally:
+            self._semaphore.release()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        await self.bot.set_webhook(
+            self.url,
+            secret_token=self.secret,
+            max_connections=min(self.max_concurrent, 100),
+            allowed_updates=self.dp.resolve_used_update_types()
+        )
+        logger.info(f"✅ Вебхук {self.url} принимает апдейты на {self.host}:{self.port}")
+
+    async def drain(self):
+        # Сначала закрываем прием, затем дожидаемся принятых апдейтов
+        if self._runner:
+            await self._runner.shutdown()
+        if self._tasks:
+            logger.info(f"🔄 Ожидание обработки {len(self._tasks)} апдейтов...")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"⚠️ Прервана обработка {len(pending)} апдейтов")
+                await asyncio.gather(*pending, return_exceptions=True)
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        logger.info("✅ Вебхук остановлен")
+
+    async def run(self):
+        """Работает до SIGINT/SIGTERM или отмены, затем плавно останавливается."""
+        workflow_data = {"dispatcher": self.dp, "bots": [self.bot], **self.dp.workflow_data}
+        await self.dp.emit_startup(bot=self.bot, **workflow_data)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        try:
+            await self.start()
+            await stop.wait()
+        finally:
+            await self.drain()
+            await self.dp.emit_shutdown(bot=self.bot, **workflow_data)
+            await self.bot.session.close()
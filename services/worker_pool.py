@@ -0,0 +1,414 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+
+from types import SimpleNamespace
+
+from aiogram.types import Message
+
+from config import Config
+from database.sqlite import Database
+from services.metrics import metrics
+from services.progress import RateLimiter
+from services.test_queue import TestJob
+from utils.test_utils import create_run_services, close_run_services, execute_test_job
+
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct("!I")
+CONNECT_TIMEOUT = 60
+STOP_TIMEOUT = 30
+RESPAWN_DELAY = 1.0
+MAX_RESPAWN_DELAY = 60.0
+START_POLL_INTERVAL = 0.5
+# После стольких неудачных запусков подряд воркер не ждут при выдаче задач
+MAX_START_FAILURES = 3
+
+
+class Channel:
+    """Кадры pickle с префиксом длины поверх Unix-сокета."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._lock = asyncio.Lock()
+
+    async def send(self, message: dict):
+        data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        async with self._lock:
+            self.writer.write(FRAME_HEADER.pack(len(data)) + data)
+            await self.writer.drain()
+
+    async def receive(self) -> dict:
+        header = await self.reader.readexactly(FRAME_HEADER.size)
+        (length,) = FRAME_HEADER.unpack(header)
+        return pickle.loads(await self.reader.readexactly(length))
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+def _plain(result):
+    # Объекты Telegram привязаны к Bot процесса бота, воркеру нужен только id
+    if isinstance(result, list):
+        return [_plain(item) for item in result]
+    if isinstance(result, Message):
+        return SimpleNamespace(message_id=result.message_id, chat_id=result.chat.id)
+    return result
+
+
+class RemoteBot:
+    """Заместитель Bot в процессе воркера.
+
+    Вызовы методов API (сообщения о прогрессе, скриншоты) передаются в
+    процесс бота и выполняются его Bot с общим лимитом на отправку.
+    """
+
+    def __init__(self, channel: Channel):
+        self._channel = channel
+        self._ids = itertools.count(1)
+        self._calls: dict[int, asyncio.Future] = {}
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        async def call(*args, **kwargs):
+            call_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._calls[call_id] = future
+            try:
+                await self._channel.send({
+                    "type": "call", "call_id": call_id,
+                    "method": method, "args": args, "kwargs": kwargs
+                })
+                return await future
+            finally:
+                self._calls.pop(call_id, None)
+
+        return call
+
+    def resolve(self, frame: dict):
+        future = self._calls.get(frame["call_id"])
+        if not future or future.done():
+            return
+        if "error" in frame:
+            future.set_exception(RuntimeError(frame["error"]))
+        else:
+            future.set_result(frame["result"])
+
+
+class WorkerProcess:
+    def __init__(self, number: int):
+        self.number = number
+        self.process: multiprocessing.Process = None
+        self.channel: Channel = None
+        self.jobs: dict[int, asyncio.Future] = {}
+        # ready - текущий процесс прислал hello, failures - неудачные запуски подряд
+        self.ready = False
+        self.failures = 0
+
+    @property
+    def failing(self) -> bool:
+        return not self.channel and self.failures >= MAX_START_FAILURES
+
+
+class WorkerPool:
+    """Прогоны тестов в отдельных процессах, у каждого свой Chromium.
+
+    Процесс бота только ставит задачи: воркер получает TestJob по
+    Unix-сокету, выполняет start_testing_process и возвращает результат
+    вместе со своими метриками. Вызовы Bot из воркера (прогресс,
+    скриншоты) приходят обратно и выполняются здесь. Задача уходит
+    наименее загруженному воркеру; упавший воркер перезапускается, а его
+    прогоны завершаются ошибкой и продолжаются с чекпоинта при повторе.
+    Воркер, который упал или завис до подключения, тоже перезапускается,
+    с растущей паузой между попытками.
+    """
+
+    def __init__(self, bot, config: Config, processes: int = 2, rate_limiter: RateLimiter = None):
+        self.bot = bot
+        self.config = config
+        self.rate_limiter = rate_limiter
+        self._workers = [WorkerProcess(number) for number in range(max(1, processes))]
+        self._available = asyncio.Condition()
+        self._server: asyncio.AbstractServer = None
+        self._socket_dir: str = None
+        self._socket_path: str = None
+        self._tasks: set[asyncio.Task] = set()
+        self._connections: set[asyncio.Task] = set()
+        self._closing = False
+
+    @property
+    def connected(self) -> int:
+        return sum(1 for worker in self._workers if worker.channel)
+
+    async def start(self):
+        # Каталог 0700 от mkdtemp: подключиться к сокету может только владелец
+        self._socket_dir = tempfile.mkdtemp(prefix="mediktests-")
+        self._socket_path = os.path.join(self._socket_dir, "workers.sock")
+        self._server = await asyncio.start_unix_server(self._on_connect, path=self._socket_path)
+        for worker in self._workers:
+            self._spawn(worker)
+
+        try:
+            async with self._available:
+                await asyncio.wait_for(
+                    self._available.wait_for(
+                        lambda: all(worker.channel or worker.failing for worker in self._workers)
+                    ),
+                    timeout=CONNECT_TIMEOUT
+                )
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Подключились {self.connected} из {len(self._workers)} воркеров")
+        logger.info(f"✅ Пул процессов запущен ({self.connected} воркеров)")
+
+    def _spawn(self, worker: WorkerProcess):
+        # spawn, а не fork: Playwright и цикл событий не переживают fork
+        context = multiprocessing.get_context("spawn")
+        worker.process = context.Process(
+            target=worker_main,
+            args=(self._socket_path, worker.number, self.config),
+            name=f"test-worker-{worker.number}",
+            daemon=True
+        )
+        worker.ready = False
+        worker.process.start()
+        self._track(asyncio.create_task(self._watch_start(worker, worker.process)))
+
+    async def _watch_start(self, worker: WorkerProcess, process: multiprocessing.Process):
+        # Пока нет hello, соединения нет, и его обработчик воркер не перезапустит
+        started = asyncio.get_running_loop().time()
+        while not worker.ready and not self._closing:
+            if not process.is_alive():
+                worker.failures += 1
+                logger.error(
+                    f"❌ Воркер {worker.number} завершился до подключения "
+                    f"(код {process.exitcode}, попытка {worker.failures})"
+                )
+                async with self._available:
+                    self._available.notify_all()
+                await self._respawn(worker)
+                return
+            if asyncio.get_running_loop().time() - started > CONNECT_TIMEOUT:
+                logger.error(f"❌ Воркер {worker.number} не подключился за {CONNECT_TIMEOUT} с")
+                process.terminate()
+            await asyncio.sleep(START_POLL_INTERVAL)
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        connection.add_done_callback(self._connections.discard)
+        channel = Channel(reader, writer)
+        try:
+            hello = await channel.receive()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            await channel.close()
+            return
+        worker = self._workers[hello["worker"]]
+        worker.channel = channel
+        worker.ready = True
+        worker.failures = 0
+        async with self._available:
+            self._available.notify_all()
+
+        try:
+            while True:
+                frame = await channel.receive()
+                if frame["type"] == "call":
+                    self._track(asyncio.create_task(self._call(channel, frame)))
+                elif frame["type"] == "result":
+                    metrics.merge(*frame["metrics"])
+                    future = worker.jobs.pop(frame["job_id"], None)
+                    if future and not future.done():
+                        future.set_result(frame["result"])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            worker.channel = None
+            await channel.close()
+            self._fail_jobs(worker)
+            if not self._closing:
+                logger.error(f"❌ Воркер {worker.number} отключился")
+                self._track(asyncio.create_task(self._respawn(worker)))
+
+    def _track(self, task: asyncio.Task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _fail_jobs(self, worker: WorkerProcess):
+        jobs, worker.jobs = worker.jobs, {}
+        for future in jobs.values():
+            if not future.done():
+                future.set_result({"error": "Процесс браузера завершился аварийно, попробуйте еще раз"})
+
+    async def _respawn(self, worker: WorkerProcess):
+        # Пауза удваивается с каждым неудачным запуском подряд
+        delay = min(RESPAWN_DELAY * 2 ** worker.failures, MAX_RESPAWN_DELAY)
+        logger.info(f"🔄 Перезапуск воркера {worker.number} через {delay:.0f} с...")
+        metrics.inc("worker_restarts_total")
+        if worker.process:
+            await asyncio.to_thread(worker.process.join, STOP_TIMEOUT)
+        await asyncio.sleep(delay)
+        if not self._closing:
+            self._spawn(worker)
+
+    async def _call(self, channel: Channel, frame: dict):
+        reply = {"type": "reply", "call_id": frame["call_id"]}
+        try:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+            method = getattr(self.bot, frame["method"])
+            reply["result"] = _plain(await method(*frame["args"], **frame["kwargs"]))
+        except Exception as e:
+            reply["error"] = str(e)
+        try:
+            await channel.send(reply)
+        except (ConnectionError, OSError):
+            pass
+
+    async def _pick_worker(self) -> WorkerProcess | None:
+        # Если все воркеры раз за разом падают при запуске, ждать их бесполезно
+        async with self._available:
+            await self._available.wait_for(
+                lambda: self.connected or all(worker.failing for worker in self._workers)
+            )
+            if not self.connected:
+                return None
+            return min(
+                (worker for worker in self._workers if worker.channel),
+                key=lambda worker: len(worker.jobs)
+            )
+
+    async def run(self, job: TestJob) -> dict:
+        try:
+            worker = await asyncio.wait_for(self._pick_worker(), timeout=CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            worker = None
+        if worker is None:
+            return {"error": "Процесс браузера недоступен, попробуйте еще раз"}
+        future = asyncio.get_running_loop().create_future()
+        worker.jobs[job.id] = future
+        try:
+            await worker.channel.send({"type": "job", "job": job})
+            return await future
+        except (ConnectionError, OSError, AttributeError):
+            return {"error": "Процесс браузера недоступен, попробуйте еще раз"}
+        except asyncio.CancelledError:
+            # Прогон отменен в очереди: останавливаем его и в воркере
+            if worker.channel:
+                with contextlib.suppress(ConnectionError, OSError):
+                    await worker.channel.send({"type": "cancel", "job_id": job.id})
+            raise
+        finally:
+            worker.jobs.pop(job.id, None)
+
+    async def close(self):
+        self._closing = True
+        for worker in self._workers:
+            if worker.channel:
+                try:
+                    await worker.channel.send({"type": "stop"})
+                except (ConnectionError, OSError):
+                    pass
+        for worker in self._workers:
+            if not worker.process:
+                continue
+            await asyncio.to_thread(worker.process.join, STOP_TIMEOUT)
+            if worker.process.is_alive():
+                logger.warning(f"⚠️ Воркер {worker.number} не остановился, завершаем принудительно")
+                worker.process.terminate()
+        # Обработчики соединений завершаются сами, когда сокет закрыт
+        for worker in self._workers:
+            if worker.channel:
+                await worker.channel.close()
+        if self._connections:
+            await asyncio.wait(set(self._connections), timeout=STOP_TIMEOUT)
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+        logger.info("✅ Пул процессов остановлен")
+
+
+def worker_main(socket_path: str, number: int, config: Config):
+    """Точка входа процесса-воркера."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - %(levelname)s - worker-{number} - %(name)s - %(message)s",
+    )
+    try:
+        asyncio.run(_serve(socket_path, number, config))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve(socket_path: str, number: int, config: Config):
+    database = Database(
+        config.db.database,
+        subscription_cache_size=config.db.subscription_cache_size,
+        subscription_negative_ttl=config.db.subscription_negative_ttl
+    )
+    await database.connect()
+    services = await create_run_services(config, database)
+
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    channel = Channel(reader, writer)
+    bot = RemoteBot(channel)
+    runs: dict[int, asyncio.Task] = {}
+
+    async def run(job: TestJob):
+        try:
+            result = await execute_test_job(job, bot, database, **services)
+        except Exception as e:
+            logger.error(f"❌ Задача {job.id} завершилась ошибкой: {e}")
+            result = {"error": f"Ошибка при прохождении теста: {e}"}
+        finally:
+            runs.pop(job.id, None)
+        await channel.send({
+            "type": "result", "job_id": job.id,
+            "result": result, "metrics": metrics.drain()
+        })
+
+    await channel.send({"type": "hello", "worker": number, "pid": os.getpid()})
+    logger.info(f"✅ Воркер {number} готов")
+    try:
+        while True:
+            frame = await channel.receive()
+            if frame["type"] == "job":
+                job = frame["job"]
+                runs[job.id] = asyncio.create_task(run(job))
+            elif frame["type"] == "reply":
+                bot.resolve(frame)
+            elif frame["type"] == "cancel":
+                task = runs.get(frame["job_id"])
+                if task:
+                    task.cancel()
+            elif frame["type"] == "stop":
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        logger.warning("⚠️ Соединение с процессом бота потеряно")
+    finally:
+        # Прерванные прогоны продолжатся с чекпоинта после перезапуска
+        for task in runs.values():
+            task.cancel()
+        await asyncio.gather(*runs.values(), return_exceptions=True)
+        await channel.close()
+        await close_run_services(services)
+        await database.close()
@@ -0,0 +1,84 @@
+import re
+import logging
+
+from database.sqlite import Database
+from utils.question_index import QuestionIndex
+from services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(text: str) -> str:
+    text = text.lower().replace('ё', 'е')
+    text = re.sub(r'[^\w\s]', ' ', text, flags=re.UNICODE)
+    return ' '.join(text.split())
+
+
+def same_numbers(first: str, second: str) -> bool:
+    # Вопросы, различающиеся только числами (дозы, сроки, проценты), разные
+    return re.findall(r'\d+', first) == re.findall(r'\d+', second)
+
+
+class AnswerBank:
+    """Локальный банк ответов поверх таблицы answer_bank.
+
+    Ключ - нормализованный текст вопроса, значение - текст правильного
+    ответа, полученный при удачном удаленном поиске. Если точного ключа
+    нет, ищется ближайший известный вопрос в QuestionIndex. Похожие
+    формулировки часто означают другой вопрос с другим ответом, поэтому
+    неточное совпадение принимается только при почти полном сходстве и
+    тех же числах в тексте.
+    """
+
+    def __init__(self, db: Database, min_similarity: float = 0.95):
+        self.db = db
+        self.min_similarity = min_similarity
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.index = QuestionIndex()
+
+    async def load(self):
+        for question_key in await self.db.get_bank_questions():
+            self.index.add(question_key)
+
+    async def get(self, question_text: str) -> str | None:
+        question_key = normalize_question(question_text)
+        answer = await self.db.get_bank_answer(question_key)
+        if answer:
+            self.hits += 1
+            metrics.inc("answer_bank_lookups_total", result="hit")
+            return answer
+
+        match = self.index.query(question_key)
+        if match and match[1] >= self.min_similarity and same_numbers(question_key, match[0]):
+            answer = await self.db.get_bank_answer(match[0])
+            if answer:
+                self.fuzzy_hits += 1
+                metrics.inc("answer_bank_lookups_total", result="fuzzy_hit")
+                return answer
+
+        self.misses += 1
+        metrics.inc("answer_bank_lookups_total", result="miss")
+        return None
+
+    async def put(self, question_text: str, answer_text: str):
+        if not answer_text:
+            return
+        question_key = normalize_question(question_text)
+        try:
+            await self.db.save_bank_answer(question_key, question_text, answer_text)
+            self.index.add(question_key)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении ответа в банк: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.fuzzy_hits + self.misses
+        return {
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 2) if total else 0,
+            "fuzzy_rate": round(self.fuzzy_hits / total * 100, 2) if total else 0
+        }
@@ -0,0 +1,92 @@
+import zlib
+
+
+class QuestionIndex:
+    """Приближенный поиск похожих вопросов (MinHash + LSH).
+
+    Вопрос разбивается на символьные n-граммы, по ним строится MinHash
+    сигнатура (one permutation hashing с уплотнением пустых корзин - один
+    хэш на n-грамму вместо num_perm), которая раскладывается по полосам
+    LSH. Кандидаты из совпавших полос проверяются точным коэффициентом
+    Жаккара, так что запрос не требует линейного прохода по всем вопросам.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, ngram: int = 3):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.ngram = ngram
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: list[dict[tuple, set[str]]] = [{} for _ in range(bands)]
+        self._shingles: dict[str, frozenset[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._shingles)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._shingles
+
+    def _shingle(self, text: str) -> frozenset[int]:
+        text = f" {text} "
+        if len(text) <= self.ngram:
+            return frozenset((zlib.crc32(text.encode()),))
+        return frozenset(
+            zlib.crc32(text[i:i + self.ngram].encode())
+            for i in range(len(text) - self.ngram + 1)
+        )
+
+    def _signature(self, shingles: frozenset[int]) -> list[int]:
+        num_perm = self.num_perm
+        signature = [None] * num_perm
+        for shingle in shingles:
+            mixed = (shingle * 0x9E3779B1) & 0xFFFFFFFF
+            slot, value = mixed % num_perm, mixed // num_perm
+            current = signature[slot]
+            if current is None or value < current:
+                signature[slot] = value
+
+        # Пустые корзины заполняем значением ближайшей непустой справа
+        # (по кругу) со смещением по расстоянию, чтобы сигнатура была плотной
+        if all(value is None for value in signature):
+            return [0] * num_perm
+        dense = list(signature)
+        next_filled = None
+        for i in reversed(range(2 * num_perm)):
+            slot = i % num_perm
+            if signature[slot] is not None:
+                next_filled = i
+            elif i < num_perm:
+                dense[slot] = signature[next_filled % num_perm] + ((next_filled - i) << 32)
+        return dense
+
+    def _bands(self, shingles: frozenset[int]):
+        signature = self._signature(shingles)
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def add(self, key: str, text: str = None):
+        """Добавляет вопрос в индекс. text по умолчанию совпадает с ключом."""
+        if key in self._shingles:
+            return
+        shingles = self._shingle(text if text is not None else key)
+        self._shingles[key] = shingles
+        for band, band_hash in self._bands(shingles):
+            self._buckets[band].setdefault(band_hash, set()).add(key)
+
+    def query(self, text: str) -> tuple[str, float] | None:
+        """Возвращает ближайший известный ключ и его сходство (0..1)."""
+        shingles = self._shingle(text)
+        candidates = set()
+        for band, band_hash in self._bands(shingles):
+            bucket = self._buckets[band].get(band_hash)
+            if bucket:
+                candidates |= bucket
+
+        best = None
+        for key in candidates:
+            other = self._shingles[key]
+            score = len(shingles & other) / len(shingles | other)
+            if best is None or score > best[1]:
+                best = (key, score)
+        return best
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from services.metrics import metrics
+
+
+def utcnow() -> datetime:
+    # SQLite datetime('now') хранит UTC без часового пояса
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class SubscriptionCache:
+    """Состояние подписок в памяти процесса с LRU-вытеснением.
+
+    Запись об активной подписке живет до ее end_date, запись об
+    отсутствии подписки - negative_ttl секунд. add_subscription сбрасывает
+    запись в своем процессе, а короткий срок отрицательных записей
+    ограничивает задержку, с которой другие экземпляры бота (несколько
+    процессов за вебхуком) видят подтвержденную оплату.
+    """
+
+    def __init__(self, max_size: int = 10_000, negative_ttl: float = 60):
+        self.max_size = max_size
+        self.negative_ttl = timedelta(seconds=negative_ttl)
+        # user_id -> (end_date, тип, срок жизни записи)
+        self._entries: OrderedDict[int, tuple[datetime | None, str | None, datetime]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> tuple[datetime | None, str | None] | None:
+        """(end_date, тип) или (None, None) без подписки; None - промах."""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[2] <= utcnow():
+            # Подписка истекла или отрицательная запись устарела - читаем заново
+            del self._entries[user_id]
+            entry = None
+        if entry is None:
+            metrics.inc("subscription_cache_lookups_total", result="miss")
+            return None
+        self._entries.move_to_end(user_id)
+        metrics.inc("subscription_cache_lookups_total", result="hit")
+        return entry[0], entry[1]
+
+    def put(self, user_id: int, end_date: datetime | None, subscription_type: str | None):
+        now = utcnow()
+        if end_date is not None and end_date <= now:
+            end_date, subscription_type = None, None
+        expires_at = end_date if end_date is not None else now + self.negative_ttl
+        self._entries[user_id] = (end_date, subscription_type, expires_at)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
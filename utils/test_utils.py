@@ -1,26 +1,152 @@
+import asyncio
+import json
+import logging
+
+from config import Config
 from database.sqlite import Database
+from keyboards.reply import get_main_keyboard
 from services.web_handler import WebHandler
+from services.browser_pool import BrowserPool
+from services.answer_source import HttpAnswerSource
+from services.wait_strategy import WaitStrategy
+from services.test_queue import TestJob
+from services.screenshots import ScreenshotReporter, Verbosity
+from services.progress import ProgressReporter, RateLimiter
+from services.resource_filter import ResourceFilter, DEFAULT_BLOCK_DOMAINS
+from services.step_timeouts import StepTimeouts
+from services.run_checkpoints import RunCheckpoints
+from services.metrics import metrics
+from utils.answer_bank import AnswerBank
+
+logger = logging.getLogger(__name__)
+
+async def create_run_services(config: Config, database: Database) -> dict:
+    """Браузеры, банк ответов и настройки прогонов для start_testing_process.
+
+    Используется и процессом бота (прогоны в том же процессе), и каждым
+    процессом-воркером, поэтому все зависимости прогона собраны здесь.
+    """
+    browser_pool = BrowserPool(
+        max_browsers=config.browser.max_browsers,
+        max_contexts=config.browser.max_contexts,
+        recycle_after=config.browser.recycle_after
+    )
+    await browser_pool.start()
+    answer_bank = AnswerBank(database)
+    await answer_bank.load()
+    answer_source = HttpAnswerSource(base_url=config.sites.answers_url)
+    await answer_source.start()
+    
+    return {
+        "browser_pool": browser_pool,
+        "answer_bank": answer_bank,
+        "answer_source": answer_source,
+        "wait_strategy": WaitStrategy(
+            timeout_ms=config.wait.timeout_ms,
+            fallback_networkidle=config.wait.fallback_networkidle,
+            fallback_sleep_ms=config.wait.fallback_sleep_ms
+        ),
+        "step_timeouts": StepTimeouts(
+            floor_ms=config.timeouts.step_floor_ms,
+            ceiling_ms=config.timeouts.step_ceiling_ms,
+            multiplier=config.timeouts.step_multiplier
+        ),
+        "resource_filter": ResourceFilter(
+            block_types=config.resources.block_types,
+            block_domains=DEFAULT_BLOCK_DOMAINS + tuple(config.resources.block_domains),
+            allow_domains=config.resources.allow_domains,
+            enabled=config.resources.enabled
+        ),
+        "run_deadline": config.timeouts.run_deadline_s or None,
+        "screenshot_verbosity": Verbosity[config.screenshots.verbosity.upper()],
+        "site_urls": {
+            "portal_url": config.sites.portal_url,
+            "base_url": config.sites.testing_url,
+            "answers_url": config.sites.answers_url
+        },
+        "screenshot_options": {
+            "image_format": config.screenshots.image_format,
+            "quality": config.screenshots.quality,
+            "scale": config.screenshots.scale
+        }
+    }
+
+async def close_run_services(services: dict):
+    await services["answer_source"].close()
+    await services["browser_pool"].close()
 
-async def start_testing_process(user_id: int, db: Database, bot=None, test_url: str = None) -> dict:
+async def _run_test(web: WebHandler, db: Database, user_id: int, login: str, password: str,
+                    test_url: str) -> dict:
+    page = await web.login(login, password)
+    if web.fresh_storage_state:
+        await db.save_session(user_id, json.dumps(web.fresh_storage_state))
+    return await web.process_test(page, test_url)
+
+async def start_testing_process(user_id: int, db: Database, bot=None, test_url: str = None,
+                                browser_pool: BrowserPool = None, answer_bank: AnswerBank = None,
+                                answer_source: HttpAnswerSource = None,
+                                wait_strategy: WaitStrategy = None,
+                                screenshot_verbosity: Verbosity = Verbosity.MILESTONES,
+                                screenshot_options: dict = None,
+                                rate_limiter: RateLimiter = None,
+                                site_urls: dict = None,
+                                resource_filter: ResourceFilter = None,
+                                step_timeouts: StepTimeouts = None,
+                                run_deadline: float = None) -> dict:
     web = None
     try:
-        credentials = db.get_user_credentials(user_id)
+        credentials = await db.get_user_credentials(user_id)
         if not credentials:
             return {"error": "Не найдены данные для входа"}
         
         login, password = credentials
-        web = WebHandler(bot_instance=bot, user_id=user_id)
+        storage_state = await db.get_session(user_id)
+        checkpoints = RunCheckpoints(db, user_id, test_url)
+        web = WebHandler(
+            bot_instance=bot,
+            user_id=user_id,
+            browser_pool=browser_pool,
+            answer_bank=answer_bank,
+            answer_source=answer_source,
+            wait_strategy=wait_strategy,
+            storage_state=json.loads(storage_state) if storage_state else None,
+            screenshots=ScreenshotReporter(
+                bot, user_id, verbosity=screenshot_verbosity, limiter=rate_limiter,
+                **(screenshot_options or {})
+            ),
+            progress=ProgressReporter(bot, user_id, limiter=rate_limiter),
+            resource_filter=resource_filter,
+            step_timeouts=step_timeouts,
+            checkpoints=checkpoints,
+            **(site_urls or {})
+        )
         
-        page = await web.login(login, password)
-        result = await web.process_test(page, test_url)
+        # Общий дедлайн прогона: по его истечении прогон отменяется, а
+        # контекст браузера сразу возвращается в пул в finally. TimeoutError
+        # изнутри прогона (таймауты шагов) дедлайном не считается
+        deadline = asyncio.timeout(run_deadline)
+        try:
+            async with deadline:
+                result = await _run_test(web, db, user_id, login, password, test_url)
+        except TimeoutError:
+            if not deadline.expired():
+                raise
+            logger.error(f"❌ Прогон пользователя {user_id} превысил дедлайн {run_deadline} с")
+            metrics.inc("test_run_deadline_exceeded_total")
+            return {"error": f"Превышено время прохождения теста ({run_deadline:.0f} с)"}
         
         # Сохраняем результат в БД
-        db.save_test_result(
+        await db.save_test_result(
             user_id=user_id,
             score=result['percentage'],
             correct=result['correct'],
             total=result['total']
         )
+        # Прогон завершен, продолжать больше нечего
+        await checkpoints.clear()
+        
+        if answer_bank:
+            logger.info(f"📚 Банк ответов: {answer_bank.stats()}")
         
         return result
     except Exception as e:
@@ -30,3 +156,50 @@ async def start_testing_process(user_id: int, db: Database, bot=None, test_url:
     finally:
         if web:
             await web.close()
+
+
+async def notify_job_started(job: TestJob, bot):
+    await bot.send_message(
+        job.user_id,
+        "🔄 Начинаю процесс тестирования...\n"
+        "Пожалуйста, подождите"
+    )
+
+
+async def execute_test_job(job: TestJob, bot, db: Database, **services) -> dict:
+    if job.screenshot_verbosity is not None:
+        services["screenshot_verbosity"] = Verbosity(job.screenshot_verbosity)
+    
+    return await start_testing_process(
+        user_id=job.user_id,
+        db=db,
+        bot=bot,
+        test_url=job.test_url,
+        **services
+    )
+
+
+async def run_test_job(job: TestJob, bot, db: Database, worker_pool=None, **services) -> dict:
+    # С пулом процессов браузер работает в воркере, здесь только итоговое сообщение
+    if worker_pool:
+        result = await worker_pool.run(job)
+    else:
+        result = await execute_test_job(job, bot, db, **services)
+    
+    if "error" in result:
+        await bot.send_message(
+            job.user_id,
+            f"❌ {result['error']}",
+            reply_markup=get_main_keyboard()
+        )
+        return result
+    
+    text = (
+        f"📊 Результат тестирования:\n"
+        f"Правильных ответов: {result['correct']}/{result['total']}\n"
+        f"Процент: {result['percentage']}%"
+    )
+    if result.get("answered_earlier"):
+        text += f"\nОтвечено до запуска (не учтено): {result['answered_earlier']}"
+    await bot.send_message(job.user_id, text, reply_markup=get_main_keyboard())
+    return result